@@ -0,0 +1,86 @@
+import heapq
+import itertools
+import time
+
+
+class DeadlineScheduler:
+    """One min-heap of deadlines, at most one live deadline per key.
+
+    schedule() replaces the key's previous deadline; cancel() is O(1): it only
+    forgets the key, and the stale heap entry is skipped when it surfaces (the
+    heap is rebuilt once stale entries outnumber live ones). pop_due() returns
+    every expired deadline in one batch for a single driver loop to dispatch.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._heap = []      # (due, seq, key)
+        self._live = {}      # key -> (due, seq, kind, payload)
+        self._seq = itertools.count()
+
+    def __contains__(self, key) -> bool:
+        return key in self._live
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    @property
+    def pending(self) -> int:
+        return len(self._live)
+
+    def schedule(self, key, delay: float, kind: str, payload=None) -> float:
+        """Set `key` to fire `kind` after `delay` seconds, replacing any deadline it had."""
+        return self.schedule_at(key, self._clock() + delay, kind, payload)
+
+    def schedule_at(self, key, due: float, kind: str, payload=None) -> float:
+        """Set `key` to fire `kind` at clock time `due` (e.g. a deadline restored from storage)."""
+        seq = next(self._seq)
+        self._live[key] = (due, seq, kind, payload)
+        heapq.heappush(self._heap, (due, seq, key))
+        self._compact()
+        return due
+
+    def cancel(self, key) -> bool:
+        """Drop the key's deadline. Returns True if one was pending."""
+        return self._live.pop(key, None) is not None
+
+    def get(self, key):
+        """(due, kind, payload) of the key's live deadline, or None."""
+        entry = self._live.get(key)
+        return (entry[0], entry[2], entry[3]) if entry else None
+
+    def items(self):
+        """Every live deadline as [(key, due, kind, payload)]."""
+        return [(key, due, kind, payload) for key, (due, _, kind, payload) in self._live.items()]
+
+    def next_due(self):
+        """Seconds until the earliest live deadline, or None if nothing is pending."""
+        self._drop_stale()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
+
+    def pop_due(self, now: float = None):
+        """Remove and return every expired deadline as [(key, kind, payload)], earliest first."""
+        now = self._clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._live.get(key)
+            if entry is not None and entry[1] == seq:
+                del self._live[key]
+                due.append((key, entry[2], entry[3]))
+        return due
+
+    def _drop_stale(self):
+        while self._heap:
+            _, seq, key = self._heap[0]
+            entry = self._live.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [(due, seq, key) for key, (due, seq, _, _) in self._live.items()]
+            heapq.heapify(self._heap)
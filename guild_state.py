@@ -0,0 +1,113 @@
+"""Per-guild configuration and in-memory state partitions.
+
+Every guild the bot serves gets a GuildState: its GuildConfig (loaded from a
+`guild_configs` document, falling back to the primary guild's built-in
+settings) plus its own voice ledger, occupancy index and in-memory daily
+leaderboards.
+
+Mongo documents are scoped by guild through user_key(): the primary guild
+keeps the original bare "<user_id>" ids so existing data stays valid, other
+guilds use "<guild_id>:<user_id>". Every scoped document also carries a
+`guild_id` field, which is what leaderboard queries filter on.
+"""
+from leaderboard_index import BoardIndex
+from leaderboard_queries import CAM_ON_FIELD, CAM_OFF_FIELD
+from voice_ledger import VoiceLedger
+from voice_occupancy import VoiceOccupancy
+
+DAILY_BOARDS = (CAM_ON_FIELD, CAM_OFF_FIELD)
+
+
+class GuildConfig:
+    """Settings for one guild; a `guild_configs` document overrides any of them."""
+
+    FIELDS = ("strict_channel_ids", "strict_name_marker", "excluded_voice_channel_id",
+              "auto_lb_channel_id", "auto_lb_ping_role_id")
+
+    def __init__(self, guild_id: int, strict_channel_ids=(), strict_name_marker: str = "Cam On",
+                 excluded_voice_channel_id: int = 0, auto_lb_channel_id: int = 0, auto_lb_ping_role_id: int = 0):
+        self.guild_id = guild_id
+        self.strict_channel_ids = {str(cid) for cid in strict_channel_ids}
+        self.strict_name_marker = strict_name_marker
+        self.excluded_voice_channel_id = int(excluded_voice_channel_id or 0)
+        self.auto_lb_channel_id = int(auto_lb_channel_id or 0)
+        self.auto_lb_ping_role_id = int(auto_lb_ping_role_id or 0)
+
+    @classmethod
+    def from_doc(cls, guild_id: int, doc: dict, defaults: "GuildConfig" = None):
+        values = {field: getattr(defaults, field) for field in cls.FIELDS} if defaults else {}
+        values.update({field: doc[field] for field in cls.FIELDS if field in (doc or {})})
+        return cls(guild_id, **values)
+
+    def is_strict(self, channel) -> bool:
+        """Camera is mandatory in this channel (listed id, or the marker in its name)"""
+        if not channel:
+            return False
+        return str(channel.id) in self.strict_channel_ids or (
+            bool(self.strict_name_marker) and self.strict_name_marker in channel.name)
+
+    def counts_time(self, channel) -> bool:
+        """Voice time in this channel goes to the leaderboards"""
+        return bool(channel) and channel.id != self.excluded_voice_channel_id
+
+
+class GuildState:
+    def __init__(self, config: GuildConfig):
+        self.config = config
+        self.voice_ledger = VoiceLedger()
+        self.voice_occupancy = VoiceOccupancy()
+        self.boards = {field: BoardIndex() for field in DAILY_BOARDS}  # user_key -> today's flushed minutes
+
+    @property
+    def guild_id(self) -> int:
+        return self.config.guild_id
+
+
+class GuildRegistry:
+    """The guilds this process serves, keyed by id."""
+
+    def __init__(self, primary_id: int, primary_config: GuildConfig = None):
+        self.primary_id = primary_id
+        self._states = {}
+        if primary_id > 0:
+            self._states[primary_id] = GuildState(primary_config or GuildConfig(primary_id))
+
+    def __contains__(self, guild_id) -> bool:
+        return guild_id in self._states
+
+    def get(self, guild_id):
+        """GuildState for a managed guild, or None"""
+        return self._states.get(guild_id)
+
+    def ids(self):
+        return list(self._states)
+
+    def states(self):
+        return list(self._states.values())
+
+    def configure(self, guild_id: int, doc: dict) -> bool:
+        """Apply a config document, adding the guild if new. Returns True if it was added."""
+        primary = self._states.get(self.primary_id)
+        config = GuildConfig.from_doc(guild_id, doc, primary.config if guild_id == self.primary_id and primary else None)
+        state = self._states.get(guild_id)
+        if state:
+            state.config = config
+            return False
+        self._states[guild_id] = GuildState(config)
+        return True
+
+    def user_key(self, guild_id: int, user_id) -> str:
+        """Mongo _id for a member of a guild (bare id in the primary guild)"""
+        if guild_id == self.primary_id:
+            return str(user_id)
+        return f"{guild_id}:{user_id}"
+
+    def split_key(self, key: str):
+        """(guild_id, user_id) for a key produced by user_key()"""
+        guild_id, sep, user_id = str(key).rpartition(":")
+        return (int(guild_id) if sep else self.primary_id), int(user_id)
+
+
+def user_id_of(key) -> str:
+    """Discord user id part of a scoped key (as a string, like the stored ids)"""
+    return str(key).rpartition(":")[2]
@@ -21,8 +21,11 @@ def get_medal_emoji(position: int) -> str:
     return "\U0001F3AF"
 
 
-def generate_leaderboard_text(cam_on_list, cam_off_list):
-    """Render the /lb message (top 5) like the provided screenshot."""
+def generate_leaderboard_text(cam_on_list, cam_off_list, title="Daily Leaderboard Champion", footer=None):
+    """Render the /lb message (top 5) like the provided screenshot.
+
+    /wlb, /mlb and /alb reuse the layout with their own title and footer lines.
+    """
     try:
         from zoneinfo import ZoneInfo
         now_dt = datetime.datetime.now(ZoneInfo('Asia/Kolkata'))
@@ -51,7 +54,7 @@ def generate_leaderboard_text(cam_on_list, cam_off_list):
     text = (
         f"{border_top}\n"
         f"        {trophy} LEGEND STAR {trophy}\n"
-        f"     {moon} Daily Leaderboard Champion {moon}\n"
+        f"     {moon} {title} {moon}\n"
         f"        {clock} {now} IST\n"
         f"{border_bot}\n\n"
         f"{cam_on_icon} **CAM ON {em_dash} TOP 5**\n"
@@ -76,20 +79,17 @@ def generate_leaderboard_text(cam_on_list, cam_off_list):
     else:
         text += '\U0001F910 *No silent sessions yet.*\n'
 
-    text += (
-        f"\n{rule}\n"
-        '\u2728 Auto Generated at **11:55 PM**\n'
-        '\U0001F504 Daily Reset at **11:59 PM**\n'
-        '\U0001F525 Keep Grinding Legends!'
-    )
+    if footer is None:
+        footer = (
+            '\u2728 Auto Generated at **11:55 PM**\n'
+            '\U0001F504 Daily Reset at **11:59 PM**\n'
+        )
+    text += f"\n{rule}\n" + footer + '\U0001F525 Keep Grinding Legends!'
     return text
 
 
-def user_rank(username: str, cam_on_data, cam_off_data):
-    # sort descending by minutes
-    cam_on_sorted = sorted(cam_on_data, key=lambda x: x[1], reverse=True)
-    cam_off_sorted = sorted(cam_off_data, key=lambda x: x[1], reverse=True)
-
+def format_rank_summary(username: str, cam_on_rank, cam_off_rank) -> str:
+    """Render the /rank card. Each rank is (rank, total, minutes, gap) or None if not active."""
     result = []
     result.append("╔══════════════════════╗")
     result.append("      🏆 YOUR RANK 🏆")
@@ -97,34 +97,19 @@ def user_rank(username: str, cam_on_data, cam_off_data):
     result.append(f"👤 User: {username}")
     result.append("━━━━━━━━━━━━━━━━━━━━━━")
 
-    # CAM ON
-    cam_on_users = [u[0] for u in cam_on_sorted]
-    if username in cam_on_users:
-        rank = cam_on_users.index(username) + 1
-        mins = cam_on_sorted[rank - 1][1]
-        medal = get_medal_emoji(rank)
-        result.append("🎥 CAM ON")
-        result.append(f"{medal} Rank: #{rank} / {len(cam_on_sorted)}")
-        result.append(f"⏱ Time: {format_time(mins)}")
-        result.append("")
-    else:
-        result.append("🎥 CAM ON")
-        result.append("❌ Not active today")
+    for title, board in (("🎥 CAM ON", cam_on_rank), ("📴 CAM OFF", cam_off_rank)):
+        result.append(title)
+        if board:
+            rank, total, mins, gap = board
+            medal = get_medal_emoji(rank)
+            result.append(f"{medal} Rank: #{rank} / {total}")
+            result.append(f"⏱ Time: {format_time(mins)}")
+            if rank > 1:
+                result.append(f"⬆️ Next rank: {format_time(gap + 1)} more")
+        else:
+            result.append("❌ Not active today")
         result.append("")
 
-    # CAM OFF
-    cam_off_users = [u[0] for u in cam_off_sorted]
-    if username in cam_off_users:
-        rank = cam_off_users.index(username) + 1
-        mins = cam_off_sorted[rank - 1][1]
-        medal = get_medal_emoji(rank)
-        result.append("📴 CAM OFF")
-        result.append(f"{medal} Rank: #{rank} / {len(cam_off_sorted)}")
-        result.append(f"⏱ Time: {format_time(mins)}")
-    else:
-        result.append("📴 CAM OFF")
-        result.append("❌ Not active today")
-
-    result.append("")
     result.append("🔥 Keep pushing. Legends rise daily!")
     return "\n".join(result)
+
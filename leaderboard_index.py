@@ -0,0 +1,81 @@
+import bisect
+
+
+class BoardIndex:
+    """One leaderboard (e.g. today's cam-on minutes) kept sorted in memory.
+
+    Entries are (-minutes, user_key) tuples in a plain sorted list, so the best
+    user is first and ties are ordered by key. Lookups (top-N, a user's rank,
+    neighbours) are binary searches; set() moves one entry with a bisect delete
+    and insort. Only users with minutes > 0 are on the board.
+    """
+
+    def __init__(self):
+        self._order = []    # (-minutes, user_key), best first
+        self._minutes = {}  # user_key -> minutes
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Board built in one sort from [(user_key, minutes)] rows."""
+        board = cls()
+        board._minutes = {key: minutes for key, minutes in rows if minutes > 0}
+        board._order = sorted((-minutes, key) for key, minutes in board._minutes.items())
+        return board
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, key) -> bool:
+        return key in self._minutes
+
+    def minutes(self, key) -> int:
+        return self._minutes.get(key, 0)
+
+    def set(self, key, minutes: int):
+        """Put `key` at `minutes` (0 or less removes it from the board)."""
+        old = self._minutes.pop(key, None)
+        if old is not None:
+            i = bisect.bisect_left(self._order, (-old, key))
+            del self._order[i]
+        if minutes > 0:
+            self._minutes[key] = minutes
+            bisect.insort(self._order, (-minutes, key))
+
+    def add(self, key, delta: int):
+        if delta:
+            self.set(key, self._minutes.get(key, 0) + delta)
+
+    def clear(self):
+        self._order.clear()
+        self._minutes.clear()
+
+    def top(self, limit: int):
+        """Best `limit` users as [(user_key, minutes)]."""
+        return [(key, -neg) for neg, key in self._order[:limit]]
+
+    def page(self, limit: int, after=None):
+        """Rows after the (minutes, user_key) cursor `after`, same order as top(): an O(log n) seek + slice."""
+        start = bisect.bisect_right(self._order, (-after[0], after[1])) if after else 0
+        return [(key, -neg) for neg, key in self._order[start:start + limit]]
+
+    def rank(self, key):
+        """(rank, total, minutes, gap) for `key`, or None if it is not on the board.
+
+        Ties share a rank (competition ranking: 1, 2, 2, 4). `gap` is how many
+        minutes behind the next higher score the user is (0 when ranked first).
+        """
+        minutes = self._minutes.get(key)
+        if minutes is None:
+            return None
+        # (-minutes,) sorts before every (-minutes, key) entry: the index is the count strictly ahead
+        ahead = bisect.bisect_left(self._order, (-minutes,))
+        gap = -self._order[ahead - 1][0] - minutes if ahead else 0
+        return ahead + 1, len(self._order), minutes, gap
+
+    def neighbors(self, key, span: int = 1):
+        """Up to `span` users either side of `key` (itself included) as [(user_key, minutes)]."""
+        minutes = self._minutes.get(key)
+        if minutes is None:
+            return []
+        i = bisect.bisect_left(self._order, (-minutes, key))
+        return [(k, -neg) for neg, k in self._order[max(0, i - span):i + span + 1]]
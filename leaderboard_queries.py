@@ -0,0 +1,82 @@
+"""Indexed leaderboard queries against the users collection.
+
+These are plain (blocking) pymongo calls with no Discord imports; main.py runs
+them on the Mongo executor. Every query filters one guild (`scope`, e.g.
+{"guild_id": ...}) and filters / sorts on a single minute field, ties broken by
+_id, so MongoDB answers it from the (guild_id, field, _id) compound indexes that
+create_indexes_async builds for each board - top-K, rank counts and keyset
+pages alike - no matter how many user documents exist.
+"""
+
+CAM_ON_FIELD = "data.voice_cam_on_minutes"
+CAM_OFF_FIELD = "data.voice_cam_off_minutes"
+# Completed days only; midnight_reset adds each day on during the rollover
+ALLTIME_ON_FIELD = "data.alltime.cam_on"
+ALLTIME_OFF_FIELD = "data.alltime.cam_off"
+
+
+def field_value(doc: dict, field: str) -> int:
+    """Read a dotted field path out of a (projected) document."""
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return 0
+        value = value.get(part)
+    return value or 0
+
+
+def top_users(collection, field: str, limit: int, scope: dict = None):
+    """Top `limit` users by `field` (minutes > 0), highest first, as [(user_key, minutes)]."""
+    cursor = collection.find(
+        {**(scope or {}), field: {"$gt": 0}},
+        projection={field: 1},
+        sort=[(field, -1)],
+        limit=limit,
+    )
+    return [(doc["_id"], field_value(doc, field)) for doc in cursor]
+
+
+def page_users(collection, field: str, limit: int, after=None, scope: dict = None):
+    """One page of a board as [(user_key, minutes)], ordered by (minutes desc, _id asc).
+
+    Keyset pagination: `after` is the (minutes, user_key) of the previous page's
+    last row, so every page is one bounded range read on the (guild_id, field, _id)
+    index - no skip(), however deep the page.
+    """
+    query = {**(scope or {}), field: {"$gt": 0}}
+    if after is not None:
+        minutes, key = after
+        query["$or"] = [{field: {"$lt": minutes}}, {field: minutes, "_id": {"$gt": key}}]
+    cursor = collection.find(query, projection={field: 1}, sort=[(field, -1), ("_id", 1)], limit=limit)
+    return [(doc["_id"], field_value(doc, field)) for doc in cursor]
+
+
+def count_ranked(collection, field: str, scope: dict = None) -> int:
+    """Number of users with any minutes on this board (index count scan)."""
+    return collection.count_documents({**(scope or {}), field: {"$gt": 0}})
+
+
+def count_ahead(collection, field: str, minutes: int, scope: dict = None) -> int:
+    """Number of users strictly ahead of `minutes` on this board."""
+    return collection.count_documents({**(scope or {}), field: {"$gt": minutes}})
+
+
+def next_score(collection, field: str, minutes: int, scope: dict = None) -> int:
+    """Lowest score strictly above `minutes` on this board (0 if none): one index seek."""
+    doc = collection.find_one({**(scope or {}), field: {"$gt": minutes}}, projection={field: 1}, sort=[(field, 1)])
+    return field_value(doc, field) if doc else 0
+
+
+def user_board_rank(collection, user_id: str, field: str, scope: dict = None):
+    """(rank, total, minutes, gap) for one user, or None if they have no minutes.
+
+    Ties share a rank (competition ranking: 1, 2, 2, 4); `gap` is the minutes
+    behind the next higher score (0 when ranked first).
+    """
+    doc = collection.find_one({"_id": user_id}, projection={field: 1})
+    minutes = field_value(doc, field) if doc else 0
+    if minutes <= 0:
+        return None
+    ahead = count_ahead(collection, field, minutes, scope)
+    gap = next_score(collection, field, minutes, scope) - minutes if ahead else 0
+    return ahead + 1, count_ranked(collection, field, scope), minutes, gap
@@ -22,19 +22,31 @@ from discord import app_commands
 from discord.ext import commands, tasks
 import os
 import asyncio
+import functools
+import itertools
 import time
 import datetime
 from datetime import timedelta
 import pytz
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import aiohttp
 from aiohttp import web
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from dotenv import load_dotenv
 from discord.app_commands import checks
 import socket
 import re
 import aiosqlite
+import uuid
+from bson import json_util
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from mongo_resilience import CircuitBreaker, backoff_delay
+from deadline_scheduler import DeadlineScheduler
+from rate_limiter import SlidingWindowCounter
+from render_cache import RenderCache
+from name_cache import NameCache
+from guild_state import DAILY_BOARDS, GuildConfig, GuildRegistry, user_id_of
 
 load_dotenv()
 
@@ -149,6 +161,37 @@ async def init_spy_db():
                 )
             """)
             
+            # Write-ahead log of MongoDB writes made while it was unreachable
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS mongo_wal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT,
+                    coll TEXT,
+                    args TEXT,
+                    op_id TEXT
+                )
+            """)
+            
+            # Crash-safe journal of counter increments not yet flushed to MongoDB
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS stat_journal (
+                    user_id TEXT,
+                    field TEXT,
+                    delta INTEGER DEFAULT 0,
+                    PRIMARY KEY (user_id, field)
+                )
+            """)
+            
+            # Journal rows handed to an in-progress flush, tagged with its flush id
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS stat_inflight (
+                    flush_id TEXT,
+                    user_id TEXT,
+                    field TEXT,
+                    delta INTEGER DEFAULT 0
+                )
+            """)
+            
             await db.commit()
             print("✅ Spy database initialized")
     except Exception as e:
@@ -172,150 +215,222 @@ VC_ABUSE_THRESHOLD = 5
 VC_ABUSE_WINDOW = 30
 
 # MongoDB Connection Handler
+# Nothing connects at import time. init_mongo() is started in the background from
+# on_ready and races every strategy concurrently; until one wins the bot runs in
+# degraded mode (mongo_connected=False, collections None) and everything else works.
 db = None
 users_coll = None
 todo_coll = None
 redlist_coll = None
 active_members_coll = None
+daily_stats_coll = None
+period_stats_coll = None
+cam_deadlines_coll = None
+guild_configs_coll = None
+mongo_client = None
 mongo_connected = False
+mongo_connect_task = None
+
+MONGO_STRATEGIES = [
+    ("SRV + Relaxed TLS", dict(
+        serverSelectionTimeoutMS=20000, connectTimeoutMS=20000, socketTimeoutMS=20000,
+        tlsAllowInvalidCertificates=True, retryWrites=True, directConnection=False
+    )),
+    ("SRV, No Retry Writes", dict(
+        serverSelectionTimeoutMS=20000, connectTimeoutMS=20000, socketTimeoutMS=20000,
+        tlsAllowInvalidCertificates=True, retryWrites=False, directConnection=False
+    )),
+    ("No TLS/SSL", dict(
+        serverSelectionTimeoutMS=20000, connectTimeoutMS=20000, socketTimeoutMS=20000,
+        ssl=False, retryWrites=False, directConnection=False
+    )),
+    ("Extended Timeout", dict(
+        serverSelectionTimeoutMS=60000, connectTimeoutMS=60000, socketTimeoutMS=60000,
+        tlsAllowInvalidCertificates=True, retryWrites=False, directConnection=False,
+        maxPoolSize=1, minPoolSize=0, maxIdleTimeMS=90000
+    )),
+]
+
+
+def _connect_strategy(options: dict):
+    """Blocking: build a client for one strategy and ping it (runs in a worker thread)"""
+    client = MongoClient(MONGODB_URI, **options)
+    try:
+        client.admin.command('ping')
+    except Exception:
+        client.close()
+        raise
+    return client
+
+
+def _close_losing_client(task: asyncio.Task):
+    """Close clients from strategies that connected after another one already won"""
+    if not task.cancelled() and task.exception() is None:
+        task.result().close()
+
 
-def init_mongo():
-    """Initialize MongoDB connection with advanced retry logic and SSL fallbacks"""
-    global db, users_coll, todo_coll, redlist_coll, active_members_coll, mongo_connected
+def bind_mongo_client(client):
+    """Point the module-level collection handles at a client (closing the previous one)"""
+    global db, users_coll, todo_coll, redlist_coll, active_members_coll, daily_stats_coll, period_stats_coll, cam_deadlines_coll, guild_configs_coll, mongo_client
+    old_client = mongo_client
+    mongo_client = client
+    if old_client is not None and old_client is not client:
+        try:
+            old_client.close()
+        except Exception:
+            pass
+    db = client["legend_star"]
+    users_coll = db["users"]
+    todo_coll = db["todo_timestamps"]
+    redlist_coll = db["redlist"]
+    active_members_coll = db["active_members"]
+    daily_stats_coll = db["daily_stats"]
+    period_stats_coll = db["period_stats"]
+    cam_deadlines_coll = db["cam_deadlines"]
+    guild_configs_coll = db["guild_configs"]
+
+
+async def init_mongo():
+    """Race all MongoDB connection strategies concurrently; the first healthy client wins"""
+    global mongo_connected
     
     print(f"📡 Attempting to connect to MongoDB: {MONGODB_URI[:50]}...")
     
-    # Strategy 1: Try with SRV and relaxed TLS
-    print("🔄 MongoDB Connection Strategy 1: SRV with Relaxed TLS...")
-    try:
-        client = MongoClient(
-            MONGODB_URI,
-            serverSelectionTimeoutMS=20000,
-            connectTimeoutMS=20000,
-            socketTimeoutMS=20000,
-            tlsAllowInvalidCertificates=True,
-            retryWrites=True,
-            directConnection=False
-        )
-        client.admin.command('ping')
-        db = client["legend_star"]
-        users_coll = db["users"]
-        todo_coll = db["todo_timestamps"]
-        redlist_coll = db["redlist"]
-        active_members_coll = db["active_members"]
-        mongo_connected = True
-        print("✅ MongoDB connected successfully (SRV + Relaxed TLS)")
-        return True
-    except Exception as e:
-        print(f"⚠️ Strategy 1 failed: {str(e)[:100]}...")
-    
-    # Strategy 2: Try with retryWrites disabled
-    print("🔄 MongoDB Connection Strategy 2: SRV without Retry Writes...")
-    try:
-        client = MongoClient(
-            MONGODB_URI,
-            serverSelectionTimeoutMS=20000,
-            connectTimeoutMS=20000,
-            socketTimeoutMS=20000,
-            tlsAllowInvalidCertificates=True,
-            retryWrites=False,
-            directConnection=False
-        )
-        client.admin.command('ping')
-        db = client["legend_star"]
-        users_coll = db["users"]
-        todo_coll = db["todo_timestamps"]
-        redlist_coll = db["redlist"]
-        active_members_coll = db["active_members"]
-        mongo_connected = True
-        print("✅ MongoDB connected successfully (SRV, No Retry Writes)")
-        return True
-    except Exception as e:
-        print(f"⚠️ Strategy 2 failed: {str(e)[:100]}...")
-    
-    # Strategy 3: Try without SSL/TLS (last resort)
-    print("🔄 MongoDB Connection Strategy 3: No TLS/SSL...")
-    try:
-        client = MongoClient(
-            MONGODB_URI,
-            serverSelectionTimeoutMS=20000,
-            connectTimeoutMS=20000,
-            socketTimeoutMS=20000,
-            ssl=False,
-            retryWrites=False,
-            directConnection=False
-        )
-        client.admin.command('ping')
-        db = client["legend_star"]
-        users_coll = db["users"]
-        todo_coll = db["todo_timestamps"]
-        redlist_coll = db["redlist"]
-        active_members_coll = db["active_members"]
-        mongo_connected = True
-        print("✅ MongoDB connected successfully (No TLS/SSL)")
-        return True
-    except Exception as e:
-        print(f"⚠️ Strategy 3 failed: {str(e)[:100]}...")
-    
-    # Strategy 4: Extended timeout with maxPoolSize=1
-    print("🔄 MongoDB Connection Strategy 4: Extended Timeout (Single Pool)...")
-    try:
-        client = MongoClient(
-            MONGODB_URI,
-            serverSelectionTimeoutMS=60000,
-            connectTimeoutMS=60000,
-            socketTimeoutMS=60000,
-            tlsAllowInvalidCertificates=True,
-            retryWrites=False,
-            directConnection=False,
-            maxPoolSize=1,
-            minPoolSize=0,
-            maxIdleTimeMS=90000
-        )
-        client.admin.command('ping')
-        db = client["legend_star"]
-        users_coll = db["users"]
-        todo_coll = db["todo_timestamps"]
-        redlist_coll = db["redlist"]
-        active_members_coll = db["active_members"]
+    # Bind lazy handles (connect=False, no I/O) first so offline writes can be
+    # journaled against the right collection while the race is running
+    if mongo_client is None:
+        try:
+            bind_mongo_client(await asyncio.to_thread(
+                MongoClient,
+                MONGODB_URI,
+                serverSelectionTimeoutMS=5000,
+                tlsAllowInvalidCertificates=True,
+                retryWrites=False,
+                connect=False
+            ))
+        except Exception as e:
+            print(f"⚠️ Could not create lazy MongoDB client: {str(e)[:80]}")
+    
+    print(f"🔄 Racing {len(MONGO_STRATEGIES)} MongoDB connection strategies concurrently...")
+    
+    # asyncio.to_thread uses the default pool, so probes never occupy the Mongo data executor
+    names = {}
+    for name, options in MONGO_STRATEGIES:
+        names[asyncio.create_task(asyncio.to_thread(_connect_strategy, options))] = name
+    
+    winner = None
+    pending = set(names)
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                print(f"⚠️ Strategy '{names[task]}' failed: {str(task.exception())[:100]}...")
+            elif winner is None:
+                winner = (names[task], task.result())
+            else:
+                task.result().close()
+    for task in pending:
+        task.add_done_callback(_close_losing_client)
+    
+    if winner:
+        name, client = winner
+        bind_mongo_client(client)
         mongo_connected = True
-        print("✅ MongoDB connected successfully (Extended Timeout)")
+        print(f"✅ MongoDB connected successfully ({name})")
+        await on_mongo_connected()
         return True
-    except Exception as e:
-        print(f"⚠️ Strategy 4 failed: {str(e)[:100]}...")
     
     # All strategies failed - use in-memory cache
     print("❌ All MongoDB connection strategies failed. Bot will use in-memory cache only.")
-    print("⚠️ Data persistence is DISABLED. Changes will be lost on restart.")
+    print("⚠️ Writes are journaled locally and will be replayed when MongoDB is reachable.")
     print("📝 Troubleshooting: Check if MongoDB Atlas IP whitelist includes your IP address")
     print("📝 If using Docker: Add 0.0.0.0/0 to IP Whitelist in MongoDB Atlas")
     print("📝 Verify credentials in MONGODB_URI are correct")
     
-    # Create empty collection objects for compatibility
+    mongo_connected = False
+    return False
+
+
+async def on_mongo_connected():
+    """Work that needs a live MongoDB, run once the background connect succeeds"""
     try:
-        client = MongoClient(
-            MONGODB_URI,
-            serverSelectionTimeoutMS=5000,
-            tlsAllowInvalidCertificates=True,
-            retryWrites=False
-        )
-        db = client["legend_star"]
-        users_coll = db["users"]
-        todo_coll = db["todo_timestamps"]
-        redlist_coll = db["redlist"]
-        active_members_coll = db["active_members"]
+        # Test MongoDB by writing a test record
+        test_result = await save_with_retry(users_coll, {"_id": "mongodb_test"}, {"$set": {"test": True}})
+        if test_result:
+            print("✅ MongoDB test write successful - Data persistence enabled!")
+        else:
+            print("⚠️ MongoDB write test failed")
     except Exception as e:
-        db = None
-        users_coll = None
-        todo_coll = None
-        redlist_coll = None
-        active_members_coll = None
+        print(f"⚠️ MongoDB test failed: {e}")
     
-    mongo_connected = False
-    return False
+    await create_indexes_async()
+    await warm_known_users()
+    schedule_mongo_replay()
+    
+    await migrate_guild_scope()
+    await load_guild_configs()
+    await rebuild_leaderboards()
+    
+    # Pick up cam enforcement deadlines that were pending before the restart
+    if bot.is_ready():
+        await restore_cam_deadlines()
 
-# Initialize MongoDB on startup
-mongo_connected = init_mongo()
+
+async def migrate_guild_scope():
+    """Stamp documents written before multi-guild support with the primary guild's id"""
+    if GUILD_ID <= 0:
+        return
+    for coll in (users_coll, daily_stats_coll, period_stats_coll, cam_deadlines_coll):
+        try:
+            result = await run_mongo(coll.update_many, {"guild_id": {"$exists": False}}, {"$set": {"guild_id": GUILD_ID}})
+            if result.modified_count:
+                print(f"🏷️ {coll.name}: {result.modified_count} documents tagged with guild {GUILD_ID}")
+        except Exception as e:
+            print(f"⚠️ Guild migration error ({coll.name}): {str(e)[:100]}")
+
+
+async def load_guild_configs():
+    """Apply guild_configs documents; newly added guilds get the slash commands synced to them"""
+    added = []
+    for doc in await safe_find(guild_configs_coll, {}):
+        try:
+            guild_id = int(doc["_id"])
+        except (KeyError, TypeError, ValueError):
+            print(f"⚠️ Skipping guild config with invalid _id: {doc.get('_id')}")
+            continue
+        if guilds.configure(guild_id, doc):
+            added.append(guild_id)
+    print(f"🏘️ Guilds served: {len(guilds.ids())} ({len(added)} added from guild_configs)")
+    if not bot.is_ready():
+        return  # on_ready reconciles and syncs every configured guild
+    for guild_id in added:
+        await setup_guild(guild_id)
+
+
+async def setup_guild(guild_id: int):
+    """Copy the slash commands to a non-primary guild, sync them and snapshot its voice state"""
+    guild = bot.get_guild(guild_id)
+    if not guild:
+        print(f"⚠️ Guild {guild_id} is configured but the bot is not in it")
+        return
+    if guild_id != GUILD_ID and GUILD_ID > 0:
+        target = discord.Object(id=guild_id)
+        for cmd in tree.get_commands(guild=GUILD):
+            tree.add_command(cmd, guild=target, override=True)
+        try:
+            synced = await tree.sync(guild=target)
+            print(f"✅ Synced {len(synced)} commands to {guild.name}")
+        except Exception as e:
+            print(f"❌ Sync failed for {guild.name}: {e}")
+    reconcile_voice_sessions(guild)
+    reconcile_cam_enforcement(guild)
+
+
+def start_mongo_connect():
+    """Kick off the background MongoDB connection once per process"""
+    global mongo_connect_task
+    if mongo_connect_task is None:
+        mongo_connect_task = asyncio.get_running_loop().create_task(init_mongo())
 
 # ====================================================
 # 🚨 ALERT SYSTEM (DM OWNER)
@@ -346,18 +461,9 @@ async def punish_human(message, reason):
     """
     user = message.author
     user_id = user.id
-    now = datetime.datetime.now().timestamp()
-
-    # 1. Initialize User Cache
-    if user_id not in strike_cache:
-        strike_cache[user_id] = []
-
-    # 2. Clean old strikes (older than 5 minutes)
-    strike_cache[user_id] = [t for t in strike_cache[user_id] if now - t < STRIKE_RESET]
 
-    # 3. Add new strike
-    strike_cache[user_id].append(now)
-    strike_count = len(strike_cache[user_id])
+    # Add the strike; strikes older than 5 minutes have already expired
+    strike_count = strike_window.hit(user_id)
 
     # --- EXECUTE JUDGMENT ---
     if strike_count == 1:
@@ -374,7 +480,7 @@ async def punish_human(message, reason):
         try:
             await user.ban(reason=f"2nd Strike (Banned): {reason}")
             await message.channel.send(f"🔨 **JUDGMENT**: {user.mention} has been **BANNED** for breaking rules twice in 5 mins.")
-            del strike_cache[user_id]  # Clear cache after ban
+            strike_window.reset(user_id)  # Clear cache after ban
         except discord.Forbidden:
             await message.channel.send("❌ I tried to ban this user, but my role is too low.")
 
@@ -462,89 +568,341 @@ def is_whitelisted_entity(actor_or_id):
     return False
 
 # Safe wrapper functions for MongoDB operations
+# pymongo is blocking, so every call is pushed onto a small bounded thread pool.
+# The event loop only awaits the future and never waits on network I/O itself.
+MONGO_MAX_WORKERS = int(os.getenv("MONGO_MAX_WORKERS", 8))
+mongo_executor = ThreadPoolExecutor(max_workers=MONGO_MAX_WORKERS, thread_name_prefix="mongo")
+
+
+async def run_mongo(func, *args, **kwargs):
+    """Run a blocking pymongo call on the Mongo executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(mongo_executor, functools.partial(func, *args, **kwargs))
 
 
-def safe_find_one(collection, query):
-    """Safely query MongoDB"""
+async def safe_find_one(collection, query, projection=None):
+    """Safely query MongoDB (pass a projection to transfer only the fields you read)"""
     if not mongo_connected or collection is None:
         return None
     try:
-        return collection.find_one(query)
+        return await run_mongo(collection.find_one, query, projection)
     except Exception as e:
         return None
 
-def safe_find(collection, query=None, limit=None):
-    """Safely find multiple documents"""
+async def safe_find(collection, query=None, limit=None, projection=None, batch_size=None):
+    """Safely find multiple documents.
+
+    projection limits the fields transferred; batch_size sets the cursor batch size.
+    For large result sets use safe_find_iter, which streams instead of building a list.
+    """
     if not mongo_connected or collection is None:
         print(f"⚠️ Cannot find: mongo_connected={mongo_connected}, collection={collection is not None}")
         return []
-    try:
-        if query is None:
-            query = {}
-        result = collection.find(query)
+    if query is None:
+        query = {}
+
+    def _find():
+        result = collection.find(query, projection)
         if limit:
             result = result.limit(limit)
-        data = list(result)
+        if batch_size:
+            result = result.batch_size(batch_size)
+        return list(result)
+
+    try:
+        data = await run_mongo(_find)
         print(f"✅ safe_find returned {len(data)} documents")
         return data
     except Exception as e:
         print(f"⚠️ safe_find error: {str(e)[:100]}")
         return []
 
-def safe_update_one(collection, query, update):
-    """Safely update one document"""
+def _next_batch(cursor, size):
+    """Blocking: pull up to `size` documents from a cursor"""
+    return list(itertools.islice(cursor, size))
+
+async def safe_find_iter(collection, query=None, projection=None, batch_size=500, strict=False):
+    """Safely stream documents: each batch is fetched on the Mongo executor and yielded one by one.
+
+    An error ends the stream early. With strict=True it is raised after logging, so a
+    caller that needs every document can tell a partial stream from a complete one.
+    """
     if not mongo_connected or collection is None:
-        return False
+        if strict:
+            raise ConnectionError("MongoDB is not connected")
+        return
     try:
-        result = collection.update_one(query, update, upsert=True)
-        if result.modified_count > 0 or result.upserted_id:
-            return True
-        # Document may not exist yet, that's okay
-        return True
+        cursor = collection.find(query or {}, projection, batch_size=batch_size)
     except Exception as e:
-        print(f"⚠️ MongoDB update error: {str(e)[:100]}")
-        return False
+        print(f"⚠️ safe_find_iter error: {str(e)[:100]}")
+        if strict:
+            raise
+        return
+    try:
+        while True:
+            try:
+                batch = await run_mongo(_next_batch, cursor, batch_size)
+            except Exception as e:
+                print(f"⚠️ safe_find_iter error: {str(e)[:100]}")
+                if strict:
+                    raise
+                return
+            if not batch:
+                return
+            for doc in batch:
+                yield doc
+    finally:
+        # close() sends killCursors to the server when the cursor is still open: keep it off the loop
+        try:
+            await run_mongo(cursor.close)
+        except Exception:
+            pass
 
-def safe_delete_one(collection, query):
-    """Safely delete one document"""
-    if not mongo_connected or collection is None:
-        return False
+# Writes go through a circuit breaker: after repeated failures it opens and
+# callers fail fast instead of each paying the full Mongo timeout. Writes that
+# could not be applied (breaker open, Mongo down or failed) are appended to a
+# durable write-ahead log in spy_tracker.db and replayed in order once it is back.
+MONGO_BREAKER_THRESHOLD = 5
+MONGO_BREAKER_RESET = 30  # seconds the breaker stays open before a probe
+MONGO_WAL_BATCH = 200     # WAL rows replayed per read
+WAL_MARKER_FIELD = "_wal_ops"  # last applied WAL op ids per document (idempotent replay)
+WAL_MARKER_KEEP = 50
+mongo_breaker = CircuitBreaker(failure_threshold=MONGO_BREAKER_THRESHOLD, reset_timeout=MONGO_BREAKER_RESET)
+mongo_wal_size = 0
+mongo_replay_task = None
+mongo_replay_lock = asyncio.Lock()
+local_db = None
+# Every handler shares one aiosqlite connection, so a commit from one would also commit
+# another's half-done statements. Each write-and-commit sequence holds this lock, which
+# makes it a real transaction (and a rollback only ever discards the holder's own work).
+local_db_lock = asyncio.Lock()
+
+
+async def get_local_db():
+    """Return the shared aiosqlite connection for the WAL and stat journal"""
+    global local_db
+    if local_db is None:
+        local_db = await aiosqlite.connect(DB_PATH)
+        await local_db.execute("PRAGMA journal_mode=WAL")
+    return local_db
+
+
+async def wal_append(op: str, coll_name: str, args) -> bool:
+    """Durably record a write that could not be applied to MongoDB"""
+    global mongo_wal_size
     try:
-        collection.delete_one(query)
+        ldb = await get_local_db()
+        async with local_db_lock:
+            await ldb.execute(
+                "INSERT INTO mongo_wal (op, coll, args, op_id) VALUES (?, ?, ?, ?)",
+                (op, coll_name, json_util.dumps(list(args)), uuid.uuid4().hex)
+            )
+            await ldb.commit()
+        mongo_wal_size += 1
         return True
     except Exception as e:
+        print(f"❌ Mongo WAL append failed - write LOST: {str(e)[:80]}")
         return False
 
-def save_with_retry(collection, query, update, max_retries=3):
-    """Save to MongoDB with retry logic"""
+
+async def load_wal_size():
+    """Count WAL rows left over from a previous process"""
+    global mongo_wal_size
+    try:
+        ldb = await get_local_db()
+        cursor = await ldb.execute("SELECT COUNT(*) FROM mongo_wal")
+        mongo_wal_size = (await cursor.fetchone())[0]
+        if mongo_wal_size:
+            print(f"📥 {mongo_wal_size} MongoDB writes waiting in the local WAL")
+    except Exception as e:
+        print(f"⚠️ Mongo WAL load error: {str(e)[:80]}")
+
+
+def _mongo_call(op: str, collection, args):
+    """Blocking pymongo call for a write (update_one always upserts)"""
+    if op == "update_one":
+        return collection.update_one(*args, upsert=True)
+    return getattr(collection, op)(*args)
+
+
+def _apply_wal_entry(op: str, collection, args, op_id: str):
+    """Blocking replay of one WAL row; applying the same row twice is a no-op"""
+    if op == "update_one":
+        query, update = args
+        if "_id" in query and "$push" not in update:
+            # Only match while this op id is not recorded on the document. If it is,
+            # the upsert collides on _id and the duplicate key means "already applied".
+            query = {**query, WAL_MARKER_FIELD: {"$ne": op_id}}
+            update = {**update, "$push": {WAL_MARKER_FIELD: {"$each": [op_id], "$slice": -WAL_MARKER_KEEP}}}
+        try:
+            return collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            return None
+    return getattr(collection, op)(*args)
+
+
+def _on_mongo_success():
+    if mongo_breaker.record_success():
+        print("✅ Mongo circuit breaker CLOSED - replaying queued writes")
+        schedule_mongo_replay()
+
+
+def _on_mongo_failure():
+    was_open = mongo_breaker.state == CircuitBreaker.OPEN
+    mongo_breaker.record_failure()
+    if not was_open and mongo_breaker.state == CircuitBreaker.OPEN:
+        print(f"🔌 Mongo circuit breaker OPEN after {mongo_breaker.failures} failures - failing fast for {MONGO_BREAKER_RESET}s")
+
+
+async def mongo_write(op: str, collection, *args, max_retries=1):
+    """Apply a write with jittered backoff behind the circuit breaker, else journal it.
+
+    Returns True once the write is applied or durably queued in the WAL.
+    """
     if collection is None:
-        print(f"⚠️ Collection is None, cannot save")
         return False
-    
-    for attempt in range(max_retries):
-        try:
-            # CRITICAL: Must use upsert=True to create documents if they don't exist
-            # Handle MongoDB conflicts by flattening $setOnInsert operations
-            result = collection.update_one(query, update, upsert=True)
-            if result.modified_count > 0 or result.upserted_id:
+    # Keep order: while older writes are still waiting, new ones queue behind them
+    if mongo_connected and not mongo_wal_size:
+        for attempt in range(max_retries):
+            if not mongo_breaker.allow():
+                break
+            try:
+                await run_mongo(_mongo_call, op, collection, args)
+                _on_mongo_success()
                 return True
-            # Document may not exist yet, that's okay - upsert created it
-            return True
-        except Exception as e:
-            error_msg = str(e)
-            # Check for conflict errors (common in nested field updates)
-            if "conflict" in error_msg.lower() or "cannot create" in error_msg.lower():
-                print(f"⚠️ Save attempt {attempt + 1} failed: MongoDB conflict detected - {error_msg[:100]}")
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(1)  # Longer wait for conflicts
-            else:
-                print(f"⚠️ Save attempt {attempt + 1} failed: {error_msg[:80]}")
+            except Exception as e:
+                _on_mongo_failure()
+                error_msg = str(e)
+                # Check for conflict errors (common in nested field updates)
+                conflict = "conflict" in error_msg.lower() or "cannot create" in error_msg.lower()
+                if conflict:
+                    print(f"⚠️ Save attempt {attempt + 1} failed: MongoDB conflict detected - {error_msg[:100]}")
+                else:
+                    print(f"⚠️ Save attempt {attempt + 1} failed: {error_msg[:80]}")
                 if attempt < max_retries - 1:
-                    import time
-                    time.sleep(0.5)  # Wait before retry (use time.sleep, not asyncio)
+                    # Longer base wait for conflicts; never blocks the event loop
+                    await asyncio.sleep(backoff_delay(attempt, base=1.0 if conflict else 0.5))
+    if await wal_append(op, collection.name, args):
+        print(f"📥 Mongo {op} on '{collection.name}' journaled for replay ({mongo_wal_size} pending)")
+        schedule_mongo_replay()
+        return True
+    return False
+
+
+async def drain_mongo_replay() -> int:
+    """Re-apply WAL rows in order while MongoDB is healthy. Returns writes applied."""
+    global mongo_wal_size
+    drained = 0
+    async with mongo_replay_lock:
+        try:
+            ldb = await get_local_db()
+            while mongo_connected and db is not None:
+                cursor = await ldb.execute(
+                    "SELECT seq, op, coll, args, op_id FROM mongo_wal ORDER BY seq LIMIT ?",
+                    (MONGO_WAL_BATCH,)
+                )
+                rows = await cursor.fetchall()
+                if not rows:
+                    mongo_wal_size = 0
+                    break
+                stopped = False
+                for seq, op, coll_name, args, op_id in rows:
+                    if not mongo_breaker.allow():
+                        stopped = True
+                        break
+                    try:
+                        await run_mongo(_apply_wal_entry, op, db[coll_name], tuple(json_util.loads(args)), op_id)
+                    except Exception as e:
+                        _on_mongo_failure()
+                        print(f"⚠️ Mongo WAL replay stopped at #{seq}: {str(e)[:80]}")
+                        stopped = True
+                        break
+                    mongo_breaker.record_success()
+                    async with local_db_lock:
+                        await ldb.execute("DELETE FROM mongo_wal WHERE seq = ?", (seq,))
+                        await ldb.commit()
+                    mongo_wal_size = max(0, mongo_wal_size - 1)
+                    drained += 1
+                if stopped:
+                    break
+        except Exception as e:
+            print(f"⚠️ Mongo WAL replay error: {str(e)[:80]}")
+    if drained:
+        print(f"♻️ Replayed {drained} journaled MongoDB writes ({mongo_wal_size} left)")
+    return drained
+
+
+def schedule_mongo_replay():
+    """Start a background drain of the WAL unless one is already running"""
+    global mongo_replay_task
+    if not mongo_wal_size or not mongo_connected or (mongo_replay_task and not mongo_replay_task.done()):
+        return
+    mongo_replay_task = asyncio.get_running_loop().create_task(drain_mongo_replay())
+
+
+async def safe_query(func, collection, *args, default=None):
+    """Safely run a blocking read helper (e.g. from leaderboard_queries) on the Mongo executor"""
+    if not mongo_connected or collection is None:
+        return default
+    try:
+        return await run_mongo(func, collection, *args)
+    except Exception as e:
+        print(f"⚠️ {getattr(func, '__name__', 'query')} error: {str(e)[:100]}")
+        return default
+
+async def safe_update_one(collection, query, update):
+    """Safely update one document (journaled for replay while MongoDB is unreachable)"""
+    ok = await mongo_write("update_one", collection, query, update)
+    if not ok:
+        print(f"⚠️ MongoDB update failed")
+    return ok
+
+async def bulk_write_failures(collection, ops):
+    """Run an unordered bulk write. Returns the indexes of the ops that failed ([] if all
+    applied), or None if nothing is known to have been applied.
+
+    With ordered=False a BulkWriteError still applies every op not in its writeErrors,
+    so only those may be retried - retrying the rest would apply them twice.
+    """
+    if not mongo_connected or collection is None or not ops:
+        return None
+    if not mongo_breaker.allow():
+        return None
+    try:
+        await run_mongo(collection.bulk_write, ops, ordered=False)
+        _on_mongo_success()
+        return []
+    except BulkWriteError as e:
+        _on_mongo_success()  # the server answered; only individual ops were rejected
+        failed = sorted({err["index"] for err in e.details.get("writeErrors", [])})
+        print(f"⚠️ MongoDB bulk write: {len(failed)}/{len(ops)} ops failed: {str(e.details.get('writeErrors', [{}])[:1])[:100]}")
+        return failed
+    except Exception as e:
+        _on_mongo_failure()
+        print(f"⚠️ MongoDB bulk write error: {str(e)[:100]}")
+        return None
+
+
+async def safe_bulk_write(collection, ops):
+    """Safely run an unordered bulk write, returning False unless every op was applied"""
+    return await bulk_write_failures(collection, ops) == []
+
+async def safe_delete_one(collection, query):
+    """Safely delete one document (journaled for replay while MongoDB is unreachable)"""
+    return await mongo_write("delete_one", collection, query)
+
+async def save_with_retry(collection, query, update, max_retries=3):
+    """Save to MongoDB with backoff retries; failed writes are journaled for replay"""
+    if collection is None:
+        if mongo_connected:
+            print(f"⚠️ Collection is None, cannot save")
+        return False
+    
+    # CRITICAL: update_one always runs with upsert=True to create documents if they don't exist
+    if await mongo_write("update_one", collection, query, update, max_retries=max_retries):
+        return True
     
-    print(f"❌ Failed to save after {max_retries} attempts")
+    print(f"❌ Failed to save after {max_retries} attempts (breaker: {mongo_breaker.state})")
     return False
 
 # Function to safely create indexes
@@ -555,8 +913,14 @@ async def create_indexes_async():
         return
     
     try:
-        users_coll.create_index("data.voice_cam_on_minutes")
-        users_coll.create_index("data.voice_cam_off_minutes")
+        # Boards are per guild: (guild_id, field, _id) compound indexes serve the top-K, the rank
+        # counts and the keyset pages of /board (ties ordered by _id)
+        for field in (CAM_ON_FIELD, CAM_OFF_FIELD, ALLTIME_ON_FIELD, ALLTIME_OFF_FIELD, YESTERDAY_ON_FIELD, YESTERDAY_OFF_FIELD):
+            await run_mongo(users_coll.create_index, [("guild_id", 1), (field, -1), ("_id", 1)])
+        await run_mongo(daily_stats_coll.create_index, [("user_id", 1), ("day", -1)])
+        await run_mongo(daily_stats_coll.create_index, [("day", 1), ("user_id", 1)])
+        await run_mongo(period_stats_coll.create_index, [("guild_id", 1), ("period", 1), ("cam_on", -1)])
+        await run_mongo(period_stats_coll.create_index, [("guild_id", 1), ("period", 1), ("cam_off", -1)])
         print("✅ MongoDB indexes created")
     except Exception as e:
         error_msg = str(e)
@@ -565,24 +929,402 @@ async def create_indexes_async():
         else:
             print(f"⚠️ Index creation failed (non-critical): {error_msg[:100]}")
 
+# ==================== WRITE-BEHIND STAT ACCUMULATOR ====================
+# Counter increments are collected per user in memory and written as one
+# bulk_write of upserting UpdateOne ops per flush instead of 2 round trips per user.
+USER_DATA_DEFAULTS = {
+    "data.voice_cam_on_minutes": 0,
+    "data.voice_cam_off_minutes": 0,
+    "data.message_count": 0,
+    "data.yesterday.cam_on": 0,
+    "data.yesterday.cam_off": 0,
+}
+pending_stat_deltas = defaultdict(lambda: defaultdict(int))  # {user_id_str: {field: delta}}
+known_user_ids = set()  # user ids known to have a users document (skip the init upsert)
+known_users_warmed = False
+
+
+def queue_stat_delta(user_id, field: str, amount: int):
+    """Add an increment for a user counter; it is written on the next flush"""
+    if amount:
+        pending_stat_deltas[str(user_id)][field] += amount
+
+
+async def ensure_user_doc(guild_id: int, user_id: int):
+    """Create the member's document with zeroed stats, at most once per member per process"""
+    key = guilds.user_key(guild_id, user_id)
+    if key in known_user_ids:
+        return
+    if await save_with_retry(users_coll, {"_id": key}, {"$setOnInsert": {"guild_id": guild_id, "data": {"voice_cam_on_minutes": 0, "voice_cam_off_minutes": 0, "message_count": 0, "yesterday": {"cam_on": 0, "cam_off": 0}}}}):
+        known_user_ids.add(key)
+
+
+async def warm_known_users():
+    """Load every existing user id (projection-only, streamed) into known_user_ids, once per process"""
+    global known_users_warmed
+    if known_users_warmed:
+        return
+    before = len(known_user_ids)
+    # Same pass seeds the leaderboard name cache with the names stored next to the stats
+    try:
+        async for doc in safe_find_iter(users_coll, {}, projection={"_id": 1, "display_name": 1}, batch_size=1000, strict=True):
+            known_user_ids.add(doc["_id"])
+            if doc.get("display_name"):
+                name_cache.put(doc["_id"], doc["display_name"], persist=False)
+    except Exception:
+        return  # partial: the ids loaded so far stay, the next connect warms again
+    known_users_warmed = True
+    print(f"👥 Known-user cache warmed: {len(known_user_ids) - before} ids loaded ({len(known_user_ids)} total, {len(name_cache)} names)")
+
+
+def build_stat_upsert(user_id: str, incs: dict, flush_id: str = None) -> UpdateOne:
+    """Upserting $inc op; defaults for the untouched fields go in $setOnInsert (no path conflict).
+
+    `flush_id` is stamped on the document so a crashed flush can tell afterwards
+    whether this op was applied (see resolve_stat_inflight).
+    """
+    defaults = {k: v for k, v in USER_DATA_DEFAULTS.items() if k not in incs}
+    # user_id is a guild-scoped key (see guild_state.user_key); new documents record their guild
+    defaults["guild_id"] = guilds.split_key(user_id)[0]
+    update = {"$inc": dict(incs), "$setOnInsert": defaults}
+    if flush_id:
+        update["$set"] = {"stat_flush_id": flush_id}
+    return UpdateOne({"_id": user_id}, update, upsert=True)
+
+
+# Counter increments are also journaled to SQLite (next to the spy tables) so that
+# they survive a crash or a MongoDB outage between flushes. A flush first moves its
+# rows to stat_inflight under a flush id (one SQLite transaction) and stamps that id on
+# every document it writes; afterwards the rows are dropped, failed ones going back to
+# the journal. If the process dies in between, resolve_stat_inflight checks the stamps
+# and only re-queues the ops MongoDB never applied.
+stat_journal_loaded = False
+stat_inflight_resolved = False
+unfinished_flushes = {}  # flush_id -> {user_id: {field: delta}} whose finish_stat_flush failed
+JOURNAL_ADD_SQL = """
+    INSERT INTO stat_journal (user_id, field, delta)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id, field)
+    DO UPDATE SET delta = delta + excluded.delta
+"""
+JOURNAL_SUB_SQL = "UPDATE stat_journal SET delta = delta - ? WHERE user_id = ? AND field = ?"
+
+
+async def journal_stat_deltas(entries):
+    """Queue counter increments [(user_id, field, amount)] and persist them to the local journal"""
+    entries = [(str(user_id), field, amount) for user_id, field, amount in entries if amount]
+    if not entries:
+        return
+    for user_id, field, amount in entries:
+        queue_stat_delta(user_id, field, amount)
+    try:
+        ldb = await get_local_db()
+        async with local_db_lock:
+            await ldb.executemany(JOURNAL_ADD_SQL, entries)
+            await ldb.commit()
+    except Exception as e:
+        print(f"⚠️ Stat journal write error: {str(e)[:80]}")
+
+
+async def journal_stat_delta(user_id, field: str, amount: int = 1):
+    """Queue a single counter increment and persist it to the local journal"""
+    await journal_stat_deltas([(user_id, field, amount)])
+
+
+async def load_stat_journal():
+    """Replay journaled increments left by a previous process into the accumulator (once)"""
+    global stat_journal_loaded
+    if stat_journal_loaded:
+        return
+    stat_journal_loaded = True
+    try:
+        ldb = await get_local_db()
+        cursor = await ldb.execute("SELECT user_id, field, delta FROM stat_journal WHERE delta > 0")
+        rows = await cursor.fetchall()
+        for user_id, field, delta in rows:
+            queue_stat_delta(user_id, field, delta)
+        if rows:
+            print(f"♻️ Recovered {len(rows)} unflushed counter entries from the stat journal")
+    except Exception as e:
+        print(f"⚠️ Stat journal load error: {str(e)[:80]}")
+
+
+async def clear_stat_journal(snapshot: dict):
+    """Subtract flushed deltas from the journal and drop empty rows"""
+    try:
+        ldb = await get_local_db()
+        async with local_db_lock:
+            await ldb.executemany(JOURNAL_SUB_SQL, [(amount, uid, field) for uid, field, amount in _journal_rows(snapshot)])
+            await ldb.execute("DELETE FROM stat_journal WHERE delta <= 0")
+            await ldb.commit()
+    except Exception as e:
+        print(f"⚠️ Stat journal cleanup error: {str(e)[:80]}")
+
+
+def _journal_rows(snapshot: dict):
+    return [(uid, field, amount) for uid, incs in snapshot.items() for field, amount in incs.items()]
+
+
+async def _local_transaction(statements) -> bool:
+    """Run [(sql, rows)] executemany statements and commit them as one transaction"""
+    try:
+        ldb = await get_local_db()
+    except Exception as e:
+        print(f"⚠️ Local DB unavailable: {str(e)[:80]}")
+        return False
+    async with local_db_lock:
+        try:
+            for sql, rows in statements:
+                await ldb.executemany(sql, rows)
+            await ldb.commit()
+            return True
+        except Exception as e:
+            print(f"⚠️ Stat journal transaction error: {str(e)[:80]}")
+            try:
+                await ldb.rollback()
+            except Exception:
+                pass
+            return False
+
+
+async def mark_stat_flush(flush_id: str, snapshot: dict) -> bool:
+    """Move a flush's deltas from the journal to stat_inflight in one transaction"""
+    rows = _journal_rows(snapshot)
+    return await _local_transaction([
+        (JOURNAL_SUB_SQL, [(amount, uid, field) for uid, field, amount in rows]),
+        ("DELETE FROM stat_journal WHERE delta <= 0", [()]),
+        ("INSERT INTO stat_inflight (flush_id, user_id, field, delta) VALUES (?, ?, ?, ?)",
+         [(flush_id, uid, field, amount) for uid, field, amount in rows]),
+    ])
+
+
+async def finish_stat_flush(flush_id: str, retry: dict) -> bool:
+    """Drop a flush's in-flight rows; deltas to retry go back to the journal (same transaction).
+
+    On failure the flush is remembered and finished before the next one starts: its
+    stat_flush_id stamps must stay current in case a crash leaves it to resolve_stat_inflight.
+    """
+    if await _local_transaction([
+        ("DELETE FROM stat_inflight WHERE flush_id = ?", [(flush_id,)]),
+        (JOURNAL_ADD_SQL, _journal_rows(retry)),
+    ]):
+        unfinished_flushes.pop(flush_id, None)
+        return True
+    unfinished_flushes[flush_id] = retry
+    return False
+
+
+async def resolve_stat_inflight() -> bool:
+    """Settle flushes interrupted by a crash: re-queue only the ops MongoDB did not apply.
+
+    Must run before the next flush stamps a new flush id on the same documents.
+    """
+    global stat_inflight_resolved
+    if stat_inflight_resolved:
+        return True
+    try:
+        ldb = await get_local_db()
+        # stat_inflight only changes under stat_flush_lock (held by our caller)
+        cursor = await ldb.execute("SELECT flush_id, user_id, field, delta FROM stat_inflight")
+        rows = await cursor.fetchall()
+        retry = defaultdict(dict)
+        applied = set()
+        if rows:
+            by_flush = defaultdict(set)
+            for flush_id, user_id, _, _ in rows:
+                by_flush[flush_id].add(user_id)
+            for flush_id, user_ids in by_flush.items():
+                docs = await run_mongo(lambda: list(users_coll.find(
+                    {"_id": {"$in": list(user_ids)}, "stat_flush_id": flush_id}, projection={"_id": 1})))
+                applied.update((flush_id, doc["_id"]) for doc in docs)
+            for flush_id, user_id, field, delta in rows:
+                if (flush_id, user_id) not in applied:
+                    retry[user_id][field] = retry[user_id].get(field, 0) + delta
+    except Exception as e:
+        print(f"⚠️ Stat in-flight recovery error: {str(e)[:80]}")
+        return False
+    if rows:
+        if not await _local_transaction([
+            ("DELETE FROM stat_inflight", [()]),
+            (JOURNAL_ADD_SQL, _journal_rows(retry)),
+        ]):
+            return False
+        for user_id, incs in retry.items():
+            for field, amount in incs.items():
+                queue_stat_delta(user_id, field, amount)
+        print(f"♻️ Interrupted stat flush settled: {len(applied)} ops were applied, {len(retry)} users re-queued")
+    stat_inflight_resolved = True
+    return True
+
+
+async def flush_stat_deltas() -> int:
+    """Write all pending counter deltas in one bulk_write. Returns users flushed (0 on failure)."""
+    if not mongo_connected:
+        return 0
+    async with stat_flush_lock:
+        if not await resolve_stat_inflight():
+            return 0
+        for flush_id, retry in list(unfinished_flushes.items()):
+            if not await finish_stat_flush(flush_id, retry):
+                return 0
+        if not pending_stat_deltas:
+            return 0
+        snapshot = {uid: dict(incs) for uid, incs in pending_stat_deltas.items() if incs}
+        pending_stat_deltas.clear()
+        flush_id = uuid.uuid4().hex
+        marked = await mark_stat_flush(flush_id, snapshot)
+        ops = [build_stat_upsert(uid, incs, flush_id if marked else None) for uid, incs in snapshot.items()]
+        failed = await bulk_write_failures(users_coll, ops)
+        uids = list(snapshot)
+        retry = set(uids) if failed is None else {uids[i] for i in failed}
+        applied = {uid: incs for uid, incs in snapshot.items() if uid not in retry}
+        if marked:
+            await finish_stat_flush(flush_id, {uid: snapshot[uid] for uid in retry})
+        elif applied:
+            await clear_stat_journal(applied)
+        if applied:
+            # The upserts created any missing documents
+            known_user_ids.update(applied)
+            apply_board_deltas(applied)
+        # Put the deltas that were not applied back so the next flush retries them
+        for uid in retry:
+            for field, amount in snapshot[uid].items():
+                pending_stat_deltas[uid][field] += amount
+        return len(applied)
+
+
+# ==================== IN-MEMORY DAILY LEADERBOARDS ====================
+# Each GuildState holds a sorted BoardIndex per daily board, mirroring what has been
+# flushed to MongoDB. Built once from the users collection, then moved by the deltas of
+# every successful flush, so /lb, /rank and auto_leaderboard need no database round trip.
+# stat_flush_lock keeps a rebuild from interleaving with a flush (no double counting).
+stat_flush_lock = asyncio.Lock()
+leaderboards_ready = False
+# Rendered /lb, /wlb, /mlb, /alb text per (guild, board): valid for the minute it shows,
+# dropped when a flush changes a top-N entry or the daily rollover rewrites the history
+render_cache = RenderCache(bucket_seconds=60)
+
+
+def apply_board_deltas(snapshot: dict):
+    """Move flushed minute deltas {user_key: {field: delta}} onto the guild boards.
+
+    A guild's rendered boards are invalidated only when its top N actually changed.
+    """
+    if not leaderboards_ready:
+        return
+    by_guild = defaultdict(list)
+    for user_key, incs in snapshot.items():
+        by_guild[guilds.split_key(user_key)[0]].append((user_key, incs))
+    for guild_id, entries in by_guild.items():
+        state = guilds.get(guild_id)
+        if not state:
+            continue
+        for field, board in state.boards.items():
+            before = board.top(LB_TOP_N)
+            for user_key, incs in entries:
+                board.add(user_key, incs.get(field, 0))
+            if board.top(LB_TOP_N) != before:
+                render_cache.invalidate(guild_id)
+
+
+def clear_leaderboards():
+    for state in guilds.states():
+        for board in state.boards.values():
+            board.clear()
+
+
+async def rebuild_leaderboards() -> bool:
+    """(Re)load every guild's daily boards from MongoDB (startup, after the daily rollover).
+
+    If the stream fails part way the boards stay unready (commands fall back to
+    indexed queries) and mongo_health_monitor retries the rebuild.
+    """
+    global leaderboards_ready
+    if not mongo_connected:
+        return False
+    async with stat_flush_lock:
+        leaderboards_ready = False
+        clear_leaderboards()
+        loaded = 0
+        query = {"$or": [{field: {"$gt": 0}} for field in DAILY_BOARDS]}
+        projection = {"guild_id": 1, **{field: 1 for field in DAILY_BOARDS}}
+        try:
+            async for doc in safe_find_iter(users_coll, query, projection=projection, batch_size=1000, strict=True):
+                try:
+                    state = guilds.get(guilds.split_key(doc["_id"])[0])
+                except (ValueError, TypeError):
+                    continue  # e.g. "mongodb_test"
+                if not state:
+                    continue
+                for field, board in state.boards.items():
+                    board.set(doc["_id"], field_value(doc, field))
+                loaded += 1
+        except Exception:
+            clear_leaderboards()
+            print(f"⚠️ Leaderboard index rebuild failed after {loaded} users - will retry")
+            return False
+        leaderboards_ready = True
+        render_cache.invalidate()
+    print(f"🏆 Leaderboard index built: {loaded} ranked users across {len(guilds.ids())} guilds")
+    return True
+
+
+async def board_top(guild: discord.Guild, field: str, limit: int):
+    """Top [(user_key, minutes)] of a daily board: in-memory index, or an indexed query until it is built"""
+    state = guilds.get(guild.id)
+    if leaderboards_ready and state:
+        return state.boards[field].top(limit)
+    return await safe_query(top_users, users_coll, field, limit, guild_scope(guild), default=[])
+
+
+async def board_rank(guild: discord.Guild, user_key: str, field: str):
+    """(rank, total, minutes, gap) on a daily board, or None if not ranked"""
+    state = guilds.get(guild.id)
+    if leaderboards_ready and state:
+        return state.boards[field].rank(user_key)
+    return await safe_query(user_board_rank, users_coll, user_key, field, guild_scope(guild))
 
 intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Auto-sharded: one process serves every configured guild, discord.py picks the shard count
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents)
 tree = bot.tree
 GUILD = discord.Object(id=GUILD_ID) if GUILD_ID > 0 else None
 
 # In-memory
-vc_join_times = {}
-cam_timers = {}
+# Per-guild partitions: config + voice ledger (cam on/off seconds) + occupancy index (backs /live).
+# The primary guild starts from the built-in settings; other guilds come from guild_configs documents.
+guilds = GuildRegistry(GUILD_ID, GuildConfig(
+    GUILD_ID,
+    strict_channel_ids=STRICT_CHANNEL_IDS,
+    excluded_voice_channel_id=EXCLUDED_VOICE_CHANNEL_ID,
+    auto_lb_channel_id=AUTO_LB_CHANNEL_ID,
+    auto_lb_ping_role_id=AUTO_LB_PING_ROLE_ID,
+))
+cam_deadlines = DeadlineScheduler(clock=time.time)  # cam enforcement warn/kick deadlines, one per (guild, member)
 user_activity = defaultdict(list)
-spam_cache = defaultdict(list)
-strike_cache = defaultdict(list)
-join_times = defaultdict(list)
-vc_cache = defaultdict(list)
+# Sliding-window counters (monotonic clock, bounded deques); sweep_rate_limiters evicts idle keys
+VC_HOP_WINDOW = 5
+VC_HOP_THRESHOLD = 3
+spam_window = SlidingWindowCounter(SPAM_WINDOW, maxlen=SPAM_THRESHOLD + 1)
+strike_window = SlidingWindowCounter(STRIKE_RESET, maxlen=2)  # 1 strike = timeout, 2 = ban
+raid_window = SlidingWindowCounter(RAID_WINDOW, maxlen=RAID_THRESHOLD + 1)
+vc_hop_window = SlidingWindowCounter(VC_HOP_WINDOW, maxlen=VC_HOP_THRESHOLD + 1)
+vc_abuse_window = SlidingWindowCounter(VC_ABUSE_WINDOW, maxlen=VC_ABUSE_THRESHOLD + 1)
+RATE_LIMITERS = {
+    "spam": spam_window,
+    "strike": strike_window,
+    "raid": raid_window,
+    "vc_hop": vc_hop_window,
+    "vc_abuse": vc_abuse_window,
+}
 last_audit_id = None  # Track last processed audit entry to prevent duplicates
-vc_saving = set()  # guard set to prevent concurrent double-saves for a user
 
-from leaderboard import format_time, get_medal_emoji, generate_leaderboard_text, user_rank
+from leaderboard import format_time, get_medal_emoji, generate_leaderboard_text, format_rank_summary
+from leaderboard_queries import CAM_ON_FIELD, CAM_OFF_FIELD, ALLTIME_ON_FIELD, ALLTIME_OFF_FIELD, field_value, top_users, page_users, count_ranked, user_board_rank
+from stats_history import week_key, month_key, record_day, rollup_periods, top_period_users, user_period_totals, user_recent_days
+
+LB_TOP_N = 5          # rows shown per board by /lb and auto_leaderboard
+LB_FETCH_LIMIT = 25   # indexed top-K fetched when non-members are filtered out afterwards
 
 def track_activity(user_id: int, action: str):
     ts = datetime.datetime.now(KOLKATA).strftime("%d/%m %H:%M:%S")
@@ -663,57 +1405,134 @@ async def action(
 # (Registered with @tree.command)
 
 # ==================== VOICE & CAM ====================
+def track_voice_state(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState, now: float):
+    """Close the member's running ledger segment and continue in the new state.
+
+    Seconds accrue per cam state; batch_save_study pays out whole minutes.
+    """
+    state = guilds.get(member.guild.id)
+    if before.channel and not after.channel:
+        state.voice_ledger.close(member.id, now)
+    elif after.channel:
+        if not before.channel:
+            track_activity(member.id, f"Joined VC: {after.channel.name}")
+            print(f"🎤 {member.display_name} joined VC - tracking started (Cam: {after.self_video})")
+        state.voice_ledger.track(member.id, after.self_video, state.config.counts_time(after.channel), now)
+
+
+def update_occupancy(member: discord.Member, after: discord.VoiceState):
+    """Mirror one member's voice state into its guild's live occupancy index"""
+    occupancy = guilds.get(member.guild.id).voice_occupancy
+    if after.channel:
+        occupancy.update(member.id, member.display_name, after.channel.id, after.channel.name, after.self_video, after.self_stream)
+    else:
+        occupancy.remove(member.id)
+
+
+def reconcile_voice_sessions(guild: discord.Guild):
+    """One snapshot of the guild's voice state, for events the bot may have missed.
+
+    Runs on_ready and on resume: closes sessions of members no longer in voice and
+    opens / updates a session for everyone currently in a voice channel.
+    """
+    state = guilds.get(guild.id)
+    if not state:
+        return
+    voice_ledger, voice_occupancy = state.voice_ledger, state.voice_occupancy
+    now = time.time()
+    closed = 0
+    for uid in voice_ledger.members():
+        member = guild.get_member(uid)
+        if not member or not member.voice or not member.voice.channel:
+            voice_ledger.close(uid, now)
+            closed += 1
+    for uid in voice_occupancy.members():
+        member = guild.get_member(uid)
+        if not member or not member.voice or not member.voice.channel:
+            voice_occupancy.remove(uid)
+    registered = []
+    for channel in guild.voice_channels:
+        for member in channel.members:
+            if member.bot:
+                continue
+            if member.id not in voice_ledger:
+                registered.append(member.display_name)
+            # Camera ON = camera is physically on; the excluded channel is tracked but not counted
+            voice_ledger.track(member.id, member.voice.self_video, state.config.counts_time(channel), now)
+            update_occupancy(member, member.voice)
+    print(f"🔄 Voice reconcile [{guild.name}]: {len(voice_ledger)} in voice, {len(registered)} registered, {closed} closed")
+    if registered:
+        print(f"   Registered: {', '.join(registered)}")
+
+
+# Voice event classes: which parts of a voice state transition the handler cares about.
+# Mute / deafen / suppress toggles match none of them and are dropped before any work.
+VOICE_CHANNEL = 1   # joined, left or moved
+VOICE_VIDEO = 2     # camera toggled
+VOICE_STREAM = 4    # screenshare toggled
+voice_event_stats = Counter()  # per-class counts plus "dropped", shown on /health
+
+
+def classify_voice_event(before: discord.VoiceState, after: discord.VoiceState) -> int:
+    changes = 0
+    if before.channel != after.channel:
+        changes |= VOICE_CHANNEL
+    if before.self_video != after.self_video:
+        changes |= VOICE_VIDEO
+    if before.self_stream != after.self_stream:
+        changes |= VOICE_STREAM
+    return changes
+
+
 @bot.event
 async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
-    if member.guild.id != GUILD_ID or member.bot:
+    if member.guild.id not in guilds or member.bot:
+        return
+    
+    changes = classify_voice_event(before, after)
+    if not changes:
+        voice_event_stats["dropped"] += 1
         return
+    for flag, name in ((VOICE_CHANNEL, "channel"), (VOICE_VIDEO, "video"), (VOICE_STREAM, "stream")):
+        if changes & flag:
+            voice_event_stats[name] += 1
+    # Time tracking, spy logs and the user record only care about channel / camera changes
+    tracked = changes & (VOICE_CHANNEL | VOICE_VIDEO)
+    
+    # Voice time is tracked from these events alone (reconcile_voice_sessions covers gaps)
+    if tracked:
+        track_voice_state(member, before, after, time.time())
+    update_occupancy(member, after)
     
     # =======================================
     # 🔊 VC SPAM SENSOR (Enhanced Hopping)
     # =======================================
-    if member.id not in TRUSTED_USERS and before.channel != after.channel:
-        now = datetime.datetime.now()
-        if member.id not in vc_cache:
-            vc_cache[member.id] = []
-        
-        # Clean old timestamps (older than 5 seconds)
-        vc_cache[member.id] = [t for t in vc_cache[member.id] if (now - t).total_seconds() < 5]
-        vc_cache[member.id].append(now)
+    if member.id not in TRUSTED_USERS and changes & VOICE_CHANNEL:
+        hops = vc_hop_window.hit(member.id)
         
         # If more than 3 joins/leaves in 5 seconds -> VC hopping detected
-        if len(vc_cache[member.id]) > 3:
-            print(f"⚠️ VC HOPPING DETECTED: {member.name} ({len(vc_cache[member.id])} actions in 5s)")
+        if hops > VC_HOP_THRESHOLD:
+            print(f"⚠️ VC HOPPING DETECTED: {member.name} ({hops} actions in 5s)")
             # This would be a human error, trigger strike system
             # For now, just timeout them
             try:
                 await member.timeout(timedelta(minutes=5), reason="VC Join/Leave Spam (Hopping)")
                 await alert_owner(member.guild, "VC HOPPING SPAM", {
                     "User": f"{member.mention}",
-                    "Actions": f"{len(vc_cache[member.id])} in 5 seconds",
+                    "Actions": f"{hops} in 5 seconds",
                     "Action": "5-minute timeout"
                 })
             except Exception as e:
                 print(f"⚠️ Failed to timeout VC hopper: {e}")
             return
     
-    user_id = str(member.id)
-    now = time.time()
-    old_in = bool(before.channel)
-    new_in = bool(after.channel)
-    # Cam is ON if: camera is on (regardless of screenshare status)
-    # Cam is OFF if: camera is off
-    # NOTE: Cam ON + Screenshare ON = counts as cam on time (both are active)
-    old_cam = before.self_video
-    new_cam = after.self_video
-
-    # Initialize user record first
-    save_with_retry(users_coll, {"_id": user_id}, {"$setOnInsert": {"data": {"voice_cam_on_minutes": 0, "voice_cam_off_minutes": 0, "message_count": 0, "yesterday": {"cam_on": 0, "cam_off": 0}}}})
+    # Initialize user record first (no-op once the user is in the known-user cache)
+    if tracked:
+        await ensure_user_doc(member.guild.id, member.id)
 
     # VC abuse check
-    if before.channel != after.channel:
-        vc_cache[member.id].append(now)
-        vc_cache[member.id] = [t for t in vc_cache[member.id] if now - t < VC_ABUSE_WINDOW]
-        if len(vc_cache[member.id]) > VC_ABUSE_THRESHOLD:
+    if changes & VOICE_CHANNEL:
+        if vc_abuse_window.hit(member.id) > VC_ABUSE_THRESHOLD:
             try:
                 await member.move_to(None, reason="VC abuse")
                 await member.timeout(timedelta(minutes=5), reason="VC hopping")
@@ -722,7 +1541,7 @@ async def on_voice_state_update(member: discord.Member, before: discord.VoiceSta
                 pass
 
     # ==================== SPY VC/CAMERA TRACKING ====================
-    if not member.bot:
+    if tracked:
         try:
             time_now = datetime.datetime.now().strftime("%d/%m %H:%M:%S")
             state = "Cam ON" if after.self_video else "Cam OFF"
@@ -786,50 +1605,6 @@ async def on_voice_state_update(member: discord.Member, before: discord.VoiceSta
         except Exception as e:
             print(f"⚠️ Spy VC tracking error: {e}")
 
-    # Save voice time IMMEDIATELY when leaving or changing settings
-    if (old_in and not new_in) or (old_in and new_in and (before.channel != after.channel or old_cam != new_cam)):
-        # Prevent concurrent batch save from also saving the same interval
-        if member.id in vc_join_times:
-            if member.id in vc_saving:
-                # Another save is in progress for this user; skip to avoid double-count
-                print(f"⏸️ Skipping immediate save for {member.display_name} - concurrent save in progress")
-            else:
-                vc_saving.add(member.id)
-                try:
-                    # Re-read join time (may have been updated by batch save)
-                    join_time = vc_join_times.get(member.id)
-                    if join_time is None:
-                        # nothing to save
-                        pass
-                    else:
-                        mins = int((now - join_time) // 60)
-                        if mins > 0:
-                            # Determine the relevant channel for this event (prefer before when leaving)
-                            relevant_channel = None
-                            if before and before.channel:
-                                relevant_channel = before.channel
-                            elif after and after.channel:
-                                relevant_channel = after.channel
-
-                            # Skip recording stats for excluded voice channel
-                            if relevant_channel and getattr(relevant_channel, 'id', None) == EXCLUDED_VOICE_CHANNEL_ID:
-                                print(f"⏭️ Skipping cam stat save for excluded channel ({EXCLUDED_VOICE_CHANNEL_ID}) for {member.display_name}")
-                            else:
-                                field = "data.voice_cam_on_minutes" if old_cam else "data.voice_cam_off_minutes"
-                                result = save_with_retry(users_coll, {"_id": user_id}, {"$inc": {field: mins}})
-                                cam_status = "🎥 ON" if old_cam else "❌ OFF"
-                                print(f"💾 [{field}] Saved {mins}m for {member.display_name} ({cam_status}) - MongoDB: {result}")
-                        # Remove tracking entry after handling leave
-                        vc_join_times.pop(member.id, None)
-                finally:
-                    vc_saving.discard(member.id)
-
-    # Track when user joins VC
-    if new_in:
-        vc_join_times[member.id] = now
-        track_activity(member.id, f"Joined VC: {after.channel.name if after.channel else 'Unknown'}")
-        print(f"🎤 {member.display_name} joined VC - tracking started (Cam: {new_cam})")
-
     # 🎥 ADVANCED CAM ENFORCEMENT SYSTEM 🎥
     # Updated Logic:
     # - Cam ON + Screenshare ON = ✅ NO WARNING (camera is on, approved)
@@ -838,15 +1613,13 @@ async def on_voice_state_update(member: discord.Member, before: discord.VoiceSta
     # - Cam OFF + Screenshare OFF = ⚠️ WARNING (no camera, no screenshare)
     
     channel = after.channel
-    if channel and (str(channel.id) in STRICT_CHANNEL_IDS or "Cam On" in channel.name):
+    if is_strict_channel(channel):
         has_cam = after.self_video  # True if camera is on
         has_screenshare = after.self_stream  # True if screensharing
         
         # ✅ PRIMARY: CAM ON - Camera is on = NO WARNING (regardless of screenshare status)
         if has_cam:
-            task = cam_timers.pop(member.id, None)
-            if task:
-                task.cancel()
+            await clear_cam_deadline(member.guild.id, member.id)
             
             # If both cam and screenshare are on, show that explicitly
             if has_screenshare:
@@ -856,234 +1629,350 @@ async def on_voice_state_update(member: discord.Member, before: discord.VoiceSta
         
         # ❌ CAM OFF - WARNING NEEDED! (screenshare is not enough, camera is required)
         else:
-            if member.id not in cam_timers:
+            if (member.guild.id, member.id) not in cam_deadlines:
                 status_text = "SCREENSHARE ON" if has_screenshare else "NO SCREENSHARE"
                 print(f"⚠️ [{member.display_name}] CAM OFF ({status_text}) - ENFORCEMENT STARTED!")
-                
-                async def enforce():
-                    # 🎯 AGGRESSIVE WARNING - Send immediately (30s delay before enforcement timer)
-                    await asyncio.sleep(30)
-                    
-                    try:
-                        embed = discord.Embed(
-                            title="🎥 ⚠️ CAMERA REQUIRED - FINAL WARNING!",
-                            description=f"{member.mention}\n\n**Please turn on your camera within 3 minutes or you will be disconnected from the voice channel!**",
-                            color=discord.Color.red()
-                        )
-                        embed.add_field(
-                            name="⏱️ TIME REMAINING",
-                            value="3 minutes to comply or automatic kick",
-                            inline=False
-                        )
-                        embed.add_field(
-                            name="✅ ACTION REQUIRED",
-                            value="• Turn on your camera\n*(Screenshare alone is not enough - camera is mandatory)*",
-                            inline=False
-                        )
-                        embed.set_footer(text="⚠️ This channel has strict camera enforcement enabled")
-                        
-                        await member.send(embed=embed)
-                        print(f"📢 [{member.display_name}] 🎥 CAM WARNING SENT - Countdown: 3 MINUTES TO COMPLY OR KICK")
-                    except Exception as e:
-                        print(f"⚠️ Failed to send enforcement warning to {member.display_name}: {e}")
-                    
-                    # ⏳ WAIT 3 MINUTES FOR USER TO COMPLY
-                    await asyncio.sleep(180)
-                    
-                    # 🔍 CHECK IF USER COMPLIED
-                    if member.voice and member.voice.channel and str(member.voice.channel.id) in STRICT_CHANNEL_IDS:
-                        current_cam = member.voice.self_video
-                        
-                        # ✅ USER COMPLIED: Camera is now ON
-                        if current_cam:
-                            print(f"✅ [{member.display_name}] COMPLIED IN TIME - CAM ON detected")
-                        
-                        # ❌ USER DIDN'T COMPLY: Camera still OFF - AUTOMATIC DISCONNECT
-                        else:
-                            print(f"🚪 [{member.display_name}] ENFORCEMENT EXECUTED - Disconnecting from VC (Channel: {member.voice.channel.name})")
-                            
-                            try:
-                                # KICK/DISCONNECT THE USER
-                                await member.move_to(None, reason="Enforcement: Camera required within 3-minute deadline")
-                                print(f"✅ [{member.display_name}] SUCCESSFULLY KICKED from voice channel")
-                                
-                                # 📢 NOTIFY CHANNEL ABOUT ENFORCEMENT ACTION
-                                try:
-                                    embed_kick = discord.Embed(
-                                        title="🚪 User Disconnected",
-                                        description=f"{member.mention} has been automatically disconnected for not enabling their camera.",
-                                        color=discord.Color.orange()
-                                    )
-                                    embed_kick.set_footer(text="Camera enforcement in strict channels")
-                                    await channel.send(embed=embed_kick, delete_after=15)
-                                except Exception:
-                                    pass
-                                
-                                # 📧 SEND DM TO USER ABOUT ENFORCEMENT
-                                try:
-                                    embed_dm = discord.Embed(
-                                        title="📵 You Were Disconnected",
-                                        description=f"You were disconnected from **{channel.name}** due to camera enforcement.\n\nCamera is mandatory in this channel (screenshare alone is not sufficient).\n\nPlease enable your camera before rejoining.",
-                                        color=discord.Color.red()
-                                    )
-                                    await member.send(embed=embed_dm)
-                                except Exception:
-                                    pass
-                                
-                            except Exception as e:
-                                print(f"⚠️ Failed to disconnect {member.display_name}: {e}")
-                    
-                    # Clean up timer
-                    cam_timers.pop(member.id, None)
-                
-                cam_timers[member.id] = bot.loop.create_task(enforce())
+                # 🎯 AGGRESSIVE WARNING - 30s delay, then 3 minutes to comply (driven by cam_enforcer)
+                await set_cam_deadline(member.guild.id, member.id, CAM_WARN_DELAY, "warn", channel.id)
+
+# ==================== CAM ENFORCEMENT SCHEDULER ====================
+# All warn / kick deadlines live in one heap (cam_deadlines) keyed by (guild id, member id) and
+# hold only ids; cam_enforcer pops whatever is due each tick and handles it in one batch.
+# Every deadline is mirrored to the cam_deadlines collection (wall-clock due time) so a
+# restart or redeploy resumes the countdown instead of forgiving everyone.
+CAM_WARN_DELAY = 30      # seconds of cam off before the warning DM
+CAM_KICK_DELAY = 180     # seconds after the warning before the disconnect
+CAM_ENFORCE_TICK = 2     # scheduler resolution in seconds
+
+
+def is_strict_channel(channel) -> bool:
+    state = guilds.get(channel.guild.id) if channel else None
+    return bool(state) and state.config.is_strict(channel)
+
+
+def needs_cam_enforcement(member: discord.Member) -> bool:
+    """In a strict channel with the camera off"""
+    voice = member.voice
+    return bool(voice and is_strict_channel(voice.channel) and not voice.self_video)
+
+
+async def save_cam_deadline(guild_id: int, member_id: int, due: float, kind: str, channel_id: int):
+    if cam_deadlines_coll is None:
+        return
+    await safe_update_one(
+        cam_deadlines_coll,
+        {"_id": guilds.user_key(guild_id, member_id)},
+        {"$set": {"guild_id": guild_id, "kind": kind, "due": due, "channel_id": channel_id}}
+    )
+
+
+async def set_cam_deadline(guild_id: int, member_id: int, delay: float, kind: str, channel_id: int):
+    """Schedule a warn / kick deadline and persist it"""
+    due = cam_deadlines.schedule((guild_id, member_id), delay, kind, channel_id)
+    await save_cam_deadline(guild_id, member_id, due, kind, channel_id)
+
+
+async def clear_cam_deadline(guild_id: int, member_id: int, force: bool = False):
+    """Cancel a member's deadline (O(1)) and drop its persisted copy"""
+    if (cam_deadlines.cancel((guild_id, member_id)) or force) and cam_deadlines_coll is not None:
+        await safe_delete_one(cam_deadlines_coll, {"_id": guilds.user_key(guild_id, member_id)})
+
+
+def reconcile_cam_enforcement(guild: discord.Guild):
+    """Match in-memory deadlines to live voice state (on_ready / resume).
+
+    Cam-off members in strict channels without a deadline get a fresh warn countdown;
+    deadlines of members who complied or left are dropped. Only memory changes here:
+    callers run restore_cam_deadlines afterwards (once MongoDB is reachable), which
+    applies persisted due times on top and persists the new countdowns.
+    """
+    started = 0
+    for channel in guild.voice_channels:
+        if not is_strict_channel(channel):
+            continue
+        for member in channel.members:
+            if member.bot or (guild.id, member.id) in cam_deadlines or member.voice.self_video:
+                continue
+            cam_deadlines.schedule((guild.id, member.id), CAM_WARN_DELAY, "warn", channel.id)
+            started += 1
+    dropped = 0
+    for key, _, _, _ in cam_deadlines.items():
+        if key[0] != guild.id:
+            continue
+        member = guild.get_member(key[1])
+        if not member or not needs_cam_enforcement(member):
+            cam_deadlines.cancel(key)
+            dropped += 1
+    print(f"🎥 Cam enforcement reconcile [{guild.name}]: {cam_deadlines.pending} pending ({started} started, {dropped} dropped)")
+
+
+async def restore_cam_deadlines():
+    """Reload persisted deadlines, keep those still enforceable and persist any set while offline"""
+    docs = await safe_find(cam_deadlines_coll, {})
+    persisted = set()
+    restored = 0
+    for doc in docs:
+        try:
+            guild_id, member_id = guilds.split_key(doc["_id"])
+        except (ValueError, KeyError):
+            continue
+        guild = bot.get_guild(guild_id) if guild_id in guilds else None
+        if not guild:
+            # Not served by this process (yet) - leave the document alone
+            continue
+        member = guild.get_member(member_id)
+        if member and needs_cam_enforcement(member):
+            # The stored due time wins: the countdown continues where it stopped
+            cam_deadlines.schedule_at((guild_id, member_id), doc["due"], doc["kind"], doc.get("channel_id"))
+            persisted.add((guild_id, member_id))
+            restored += 1
+        else:
+            await clear_cam_deadline(guild_id, member_id, force=True)
+    for key, due, kind, channel_id in cam_deadlines.items():
+        if key not in persisted:
+            await save_cam_deadline(key[0], key[1], due, kind, channel_id)
+    print(f"🎥 Restored {restored} cam enforcement deadlines ({cam_deadlines.pending} pending)")
+
+
+async def send_cam_warning(guild: discord.Guild, member_id: int, channel_id: int):
+    """Warn deadline: DM the final warning and start the 3-minute kick countdown"""
+    member = guild.get_member(member_id)
+    if not member:
+        return
+    await set_cam_deadline(guild.id, member_id, CAM_KICK_DELAY, "kick", channel_id)
+    try:
+        embed = discord.Embed(
+            title="🎥 ⚠️ CAMERA REQUIRED - FINAL WARNING!",
+            description=f"{member.mention}\n\n**Please turn on your camera within 3 minutes or you will be disconnected from the voice channel!**",
+            color=discord.Color.red()
+        )
+        embed.add_field(
+            name="⏱️ TIME REMAINING",
+            value="3 minutes to comply or automatic kick",
+            inline=False
+        )
+        embed.add_field(
+            name="✅ ACTION REQUIRED",
+            value="• Turn on your camera\n*(Screenshare alone is not enough - camera is mandatory)*",
+            inline=False
+        )
+        embed.set_footer(text="⚠️ This channel has strict camera enforcement enabled")
+        
+        await member.send(embed=embed)
+        print(f"📢 [{member.display_name}] 🎥 CAM WARNING SENT - Countdown: 3 MINUTES TO COMPLY OR KICK")
+    except Exception as e:
+        print(f"⚠️ Failed to send enforcement warning to {member.display_name}: {e}")
+
+
+async def enforce_cam_kick(guild: discord.Guild, member_id: int, channel_id: int):
+    """Kick deadline: disconnect the member if they are still in a strict channel with cam off"""
+    member = guild.get_member(member_id)
+    # 🔍 CHECK IF USER COMPLIED
+    state = guilds.get(guild.id)
+    if not member or not state or not (member.voice and member.voice.channel and str(member.voice.channel.id) in state.config.strict_channel_ids):
+        return
+    
+    # ✅ USER COMPLIED: Camera is now ON
+    if member.voice.self_video:
+        print(f"✅ [{member.display_name}] COMPLIED IN TIME - CAM ON detected")
+        return
+    
+    # ❌ USER DIDN'T COMPLY: Camera still OFF - AUTOMATIC DISCONNECT
+    print(f"🚪 [{member.display_name}] ENFORCEMENT EXECUTED - Disconnecting from VC (Channel: {member.voice.channel.name})")
+    channel = guild.get_channel(channel_id)
+    try:
+        # KICK/DISCONNECT THE USER
+        await member.move_to(None, reason="Enforcement: Camera required within 3-minute deadline")
+        print(f"✅ [{member.display_name}] SUCCESSFULLY KICKED from voice channel")
+        
+        # 📢 NOTIFY CHANNEL ABOUT ENFORCEMENT ACTION
+        try:
+            embed_kick = discord.Embed(
+                title="🚪 User Disconnected",
+                description=f"{member.mention} has been automatically disconnected for not enabling their camera.",
+                color=discord.Color.orange()
+            )
+            embed_kick.set_footer(text="Camera enforcement in strict channels")
+            await channel.send(embed=embed_kick, delete_after=15)
+        except Exception:
+            pass
+        
+        # 📧 SEND DM TO USER ABOUT ENFORCEMENT
+        try:
+            embed_dm = discord.Embed(
+                title="📵 You Were Disconnected",
+                description=f"You were disconnected from **{channel.name if channel else 'the voice channel'}** due to camera enforcement.\n\nCamera is mandatory in this channel (screenshare alone is not sufficient).\n\nPlease enable your camera before rejoining.",
+                color=discord.Color.red()
+            )
+            await member.send(embed=embed_dm)
+        except Exception:
+            pass
+        
+    except Exception as e:
+        print(f"⚠️ Failed to disconnect {member.display_name}: {e}")
+
+
+CAM_DEADLINE_HANDLERS = {"warn": send_cam_warning, "kick": enforce_cam_kick}
+
+
+@tasks.loop(seconds=CAM_ENFORCE_TICK)
+async def cam_enforcer():
+    """Fire every due cam enforcement deadline in one batch"""
+    due = cam_deadlines.pop_due()
+    if not due:
+        return
+    # Keys are (guild_id, member_id); deadlines of guilds no longer available just expire
+    runnable = [(key, kind, channel_id, bot.get_guild(key[0])) for key, kind, channel_id in due]
+    runnable = [entry for entry in runnable if entry[3]]
+    results = await asyncio.gather(
+        *(CAM_DEADLINE_HANDLERS[kind](guild, key[1], channel_id) for key, kind, channel_id, guild in runnable),
+        return_exceptions=True
+    )
+    for (key, kind, _, _), result in zip(runnable, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ Cam enforcement {kind} failed for {key[1]}: {str(result)[:80]}")
+    for key, _, _ in due:
+        if key not in cam_deadlines:
+            # Finished (not rescheduled as a kick) - drop the persisted copy
+            await clear_cam_deadline(key[0], key[1], force=True)
 
-@tasks.loop(seconds=30)
-async def batch_save_study():
-    """Save voice & cam stats every 30 seconds for accurate tracking"""
-    if GUILD_ID <= 0 or not mongo_connected:
+
+@cam_enforcer.before_loop
+async def before_cam_enforcer():
+    await bot.wait_until_ready()
+
+
+@tasks.loop(minutes=10)
+async def sweep_rate_limiters():
+    """Evict idle keys from every sliding-window counter so memory stays flat"""
+    evicted = {name: limiter.sweep() for name, limiter in RATE_LIMITERS.items()}
+    if any(evicted.values()):
+        print(f"🧹 Rate limiter sweep: evicted {sum(evicted.values())} idle keys {evicted}")
+
+
+# ==================== MONGO HEALTH MONITOR ====================
+# mongo_connected is live state: the monitor pings on an interval, flips the flag
+# both ways and rebuilds the client (re-racing the strategies) after repeated failures.
+MONGO_HEALTH_INTERVAL = 30  # seconds between pings
+MONGO_DOWN_AFTER = 2        # consecutive failed pings before marking Mongo down
+MONGO_REBUILD_AFTER = 4     # consecutive failed pings before rebuilding the client
+mongo_latency_ms = None     # last successful ping round trip
+mongo_health_failures = 0
+mongo_last_health_check = None
+
+
+def _ping_mongo(client):
+    """Blocking ping, returns round trip in milliseconds"""
+    started = time.perf_counter()
+    client.admin.command('ping')
+    return (time.perf_counter() - started) * 1000
+
+
+def mongo_health_snapshot() -> dict:
+    """Current Mongo health for monitoring (keep-alive /health endpoint)"""
+    return {
+        "connected": mongo_connected,
+        "latency_ms": round(mongo_latency_ms, 1) if mongo_latency_ms is not None else None,
+        "consecutive_failures": mongo_health_failures,
+        "breaker": mongo_breaker.state,
+        "wal_pending": mongo_wal_size,
+        "pending_stat_users": len(pending_stat_deltas),
+        "last_check": mongo_last_health_check,
+    }
+
+
+@tasks.loop(seconds=MONGO_HEALTH_INTERVAL)
+async def mongo_health_monitor():
+    """Ping MongoDB, keep mongo_connected accurate and reconnect when it stays down"""
+    global mongo_connected, mongo_latency_ms, mongo_health_failures, mongo_last_health_check, mongo_connect_task
+    # A (re)connect race is still running - let it decide
+    if mongo_connect_task is not None and not mongo_connect_task.done():
         return
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
+    mongo_last_health_check = datetime.datetime.now(KOLKATA).isoformat()
+    if mongo_client is None:
+        mongo_connect_task = bot.loop.create_task(init_mongo())
         return
-    now = time.time()
     try:
-        saved_count = 0
-        processed = set()
-        
-        # ✅ FIRST: Save all users currently in vc_join_times (already tracked)
-        for uid, join in list(vc_join_times.items()):
-            member = guild.get_member(uid)
-            if not member or not member.voice or not member.voice.channel:
-                # User left VC, remove from tracking
-                vc_join_times.pop(uid, None)
-                continue
-            
-            # Calculate minutes elapsed since last save (at least 30 seconds)
-            mins = int((now - join) // 60)
-            
-            # Only save if at least 30 seconds have passed
-            if mins > 0 or (now - join) >= 30:
-                # FIXED CAM DETECTION LOGIC:
-                # Cam ON = camera is ON (regardless of screenshare)
-                # Cam OFF = camera is OFF
-                cam = member.voice.self_video
-                
-                # Skip saving for excluded voice channel
-                try:
-                    current_channel = member.voice.channel
-                except Exception:
-                    current_channel = None
+        # Own thread (not the data executor) so a saturated pool can't fake an outage
+        latency = await asyncio.wait_for(asyncio.to_thread(_ping_mongo, mongo_client), timeout=15)
+    except Exception as e:
+        mongo_health_failures += 1
+        print(f"⚠️ Mongo health check failed ({mongo_health_failures}x): {str(e)[:80]}")
+        if mongo_connected and mongo_health_failures >= MONGO_DOWN_AFTER:
+            mongo_connected = False
+            print("🔴 MongoDB marked DOWN - running in degraded mode")
+        if mongo_health_failures >= MONGO_REBUILD_AFTER:
+            print("🔄 Rebuilding MongoDB client...")
+            mongo_health_failures = 0
+            mongo_connect_task = bot.loop.create_task(init_mongo())
+        return
+    
+    mongo_latency_ms = latency
+    mongo_health_failures = 0
+    if not mongo_connected:
+        mongo_connected = True
+        print(f"🟢 MongoDB back UP (ping {latency:.0f}ms) - persistence re-enabled")
+        await on_mongo_connected()
+        schedule_mongo_replay()
+    elif not leaderboards_ready:
+        await rebuild_leaderboards()  # an earlier rebuild failed part way
+    if history_pending_day and mongo_connected:
+        await record_history(history_pending_day)
 
-                if current_channel and getattr(current_channel, 'id', None) == EXCLUDED_VOICE_CHANNEL_ID:
-                    print(f"⏭️ Skipping batch save for excluded channel ({EXCLUDED_VOICE_CHANNEL_ID}) for {member.display_name}")
-                    vc_join_times[uid] = now
-                    processed.add(uid)
-                    continue
 
-                # Only save 1 minute at a time if less than 1 minute has passed
-                mins_to_save = max(1, mins) if mins > 0 else 1
+@mongo_health_monitor.before_loop
+async def before_mongo_health_monitor():
+    await bot.wait_until_ready()
 
-                # Avoid concurrent saves for same user
-                if uid in vc_saving:
-                    print(f"⏸️ Skipping batch save for {member.display_name} - concurrent save in progress")
-                    vc_join_times[uid] = now
-                    processed.add(uid)
-                    continue
-                vc_saving.add(uid)
-                try:
-                    if mins_to_save > 0:
-                        field = "data.voice_cam_on_minutes" if cam else "data.voice_cam_off_minutes"
-                        # FIX: Separate operations to avoid MongoDB conflict
-                        # First: Create document if it doesn't exist
-                        users_coll.update_one(
-                            {"_id": str(uid)},
-                            {"$setOnInsert": {
-                                "data": {
-                                    "voice_cam_on_minutes": 0,
-                                    "voice_cam_off_minutes": 0,
-                                    "message_count": 0,
-                                    "yesterday": {"cam_on": 0, "cam_off": 0}
-                                }
-                            }},
-                            upsert=True
-                        )
-                        # Then: Increment the field
-                        result = save_with_retry(users_coll, {"_id": str(uid)}, {"$inc": {field: mins_to_save}})
-                        if result:
-                            cam_status = "🎥 ON" if cam else "❌ OFF"
-                            print(f"⏱️ {member.display_name}: +{mins_to_save}m {field} ({cam_status}) ✅")
-                            saved_count += 1
-                        # Reset join time after saving
-                        vc_join_times[uid] = now
-                finally:
-                    vc_saving.discard(uid)
-                processed.add(uid)
-        
-        # ✅ SECOND: Also save ALL members currently in any voice channel (fallback tracking)
-        # This ensures users who joined before bot started are still tracked
-        newly_registered = []  # Track newly registered users
-        for channel in guild.voice_channels:
-            for member in channel.members:
-                if member.bot or member.id in processed:
-                    continue
-                
-                # Initialize if not in vc_join_times
-                if member.id not in vc_join_times:
-                    vc_join_times[member.id] = now
-                    mins = 0  # Just initialized, don't save time yet
-                    newly_registered.append(member.display_name)  # Add to list instead of printing
-                else:
-                    mins = int((now - vc_join_times[member.id]) // 60)
-                
-                if mins > 0 or (now - vc_join_times[member.id]) >= 30:
-                    # FIXED CAM DETECTION: Camera ON = camera is physically on
-                    cam = member.voice.self_video
-                    
-                    # Skip saving for excluded voice channel
-                    if getattr(channel, 'id', None) == EXCLUDED_VOICE_CHANNEL_ID:
-                        print(f"⏭️ Skipping batch save for excluded channel ({EXCLUDED_VOICE_CHANNEL_ID}) for {member.display_name}")
-                        vc_join_times[member.id] = now
-                        continue
-                    
-                    mins_to_save = max(1, mins) if mins > 0 else 1
 
-                    # Avoid concurrent saves for same user
-                    if member.id in vc_saving:
-                        print(f"⏸️ Skipping fallback batch save for {member.display_name} - concurrent save in progress")
-                        continue
-                    vc_saving.add(member.id)
-                    try:
-                        if mins_to_save > 0:
-                            field = "data.voice_cam_on_minutes" if cam else "data.voice_cam_off_minutes"
-                            # FIX: Separate operations to avoid MongoDB conflict
-                            users_coll.update_one(
-                                {"_id": str(member.id)},
-                                {"$setOnInsert": {
-                                    "data": {
-                                        "voice_cam_on_minutes": 0,
-                                        "voice_cam_off_minutes": 0,
-                                        "message_count": 0,
-                                        "yesterday": {"cam_on": 0, "cam_off": 0}
-                                    }
-                                }},
-                                upsert=True
-                            )
-                            result = save_with_retry(users_coll, {"_id": str(member.id)}, {"$inc": {field: mins_to_save}})
-                            if result:
-                                cam_status = "🎥 ON" if cam else "❌ OFF"
-                                print(f"⏱️ {member.display_name}: +{mins_to_save}m {field} ({cam_status}) ✅")
-                                saved_count += 1
-                        vc_join_times[member.id] = now
-                    finally:
-                        vc_saving.discard(member.id)
-        
-        # Print consolidated registration message (only ONE message)
-        if newly_registered:
-            print(f"🔄 Registered ({len(newly_registered)} new): {', '.join(newly_registered)}")
-        
-        if saved_count > 0:
-            print(f"📊 30-second batch save: Updated {saved_count} active members in voice")
+VOICE_TICK_SECONDS = 60      # how often the ledger pays whole minutes into the local journal
+STAT_FLUSH_INTERVAL = 300    # how often the journaled counters are bulk-written to MongoDB
+last_stat_flush = 0.0
+
+
+async def journal_voice_minutes(now: float = None):
+    """Move whole minutes out of every guild's voice ledger into the stat journal (carry stays behind)"""
+    payout = []
+    for state in guilds.states():
+        payout.extend(
+            (guilds.user_key(state.guild_id, uid), cam, mins)
+            for uid, cam, mins in state.voice_ledger.take_minutes(now)
+        )
+    await journal_stat_deltas([(key, CAM_ON_FIELD if cam else CAM_OFF_FIELD, mins) for key, cam, mins in payout])
+    return payout
+
+
+async def flush_study_stats() -> int:
+    """Pay out the voice ledger and bulk-write every pending counter now"""
+    global last_stat_flush
+    await journal_voice_minutes()
+    last_stat_flush = time.monotonic()
+    flushed = await flush_stat_deltas()
+    await flush_display_names()
+    return flushed
+
+
+@tasks.loop(seconds=VOICE_TICK_SECONDS)
+async def batch_save_study():
+    """Journal voice & cam minutes every minute; flush coalesced counters (voice minutes + messages) every few minutes.
+
+    Only flushes: sessions are opened / closed by on_voice_state_update and reconcile_voice_sessions.
+    """
+    # Runs while MongoDB is down too: deltas are journaled locally and flushed once it is back
+    now = time.time()
+    try:
+        # ✅ FIRST: Whole minutes go to the local journal every tick (sub-minute remainders carry over)
+        payout = await journal_voice_minutes(now)
+        if payout:
+            print(f"⏱️ Voice ledger: +{sum(m for _, _, m in payout)}m across {len(payout)} counters journaled")
+        
+        # ✅ SECOND: One bulk_write for every pending delta, every STAT_FLUSH_INTERVAL seconds
+        if time.monotonic() - last_stat_flush >= STAT_FLUSH_INTERVAL:
+            saved_count = await flush_study_stats()
+            if saved_count > 0:
+                print(f"📊 Batch save: Updated {saved_count} users in one bulk write")
+        # Retry writes that failed earlier (this also acts as the half-open breaker probe)
+        schedule_mongo_replay()
     except Exception as e:
         print(f"⚠️ Batch save error: {str(e)[:100]}")
 
@@ -1101,71 +1990,114 @@ async def before_batch_save():
 
 @tasks.loop(time=datetime.time(23, 55, tzinfo=KOLKATA))
 async def auto_leaderboard_ping():
-    """Auto ping at 23:55 IST to announce leaderboard with top 5"""
-    if GUILD_ID <= 0 or not mongo_connected:
-        return
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        return
-    channel = guild.get_channel(AUTO_LB_CHANNEL_ID)
-    if not channel:
+    """Auto ping at 23:55 IST to announce leaderboard with top 5 (every guild with an auto-LB channel)"""
+    if not mongo_connected:
         return
-    try:
-        role = guild.get_role(AUTO_LB_PING_ROLE_ID)
-        if not role:
-            print(f"⚠️ Auto ping role {AUTO_LB_PING_ROLE_ID} not found")
-            return
-        
-        ping_text = f"{role.mention} 🏆 **Leaderboard Published With Top 5 Performers!**\n✨ Check the rankings below and compete for glory! ✨"
-        await channel.send(ping_text)
-        print(f"✅ Auto ping sent at 23:55 IST to {role.name}")
-    except Exception as e:
-        print(f"⚠️ Auto ping error: {str(e)[:100]}")
+    for state in guilds.states():
+        guild = bot.get_guild(state.guild_id)
+        if not guild:
+            continue
+        channel = guild.get_channel(state.config.auto_lb_channel_id)
+        if not channel:
+            continue
+        try:
+            role = guild.get_role(state.config.auto_lb_ping_role_id)
+            if not role:
+                print(f"⚠️ Auto ping role {state.config.auto_lb_ping_role_id} not found in {guild.name}")
+                continue
+            
+            ping_text = f"{role.mention} 🏆 **Leaderboard Published With Top 5 Performers!**\n✨ Check the rankings below and compete for glory! ✨"
+            await channel.send(ping_text)
+            print(f"✅ Auto ping sent at 23:55 IST to {role.name} ({guild.name})")
+        except Exception as e:
+            print(f"⚠️ Auto ping error ({guild.name}): {str(e)[:100]}")
 
 @tasks.loop(time=datetime.time(23, 55, tzinfo=KOLKATA))
 async def auto_leaderboard():
-    """Auto leaderboard at 23:55 IST - shows today's TOP 5 data before reset"""
-    if GUILD_ID <= 0 or not mongo_connected:
-        return
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        return
-    channel = guild.get_channel(AUTO_LB_CHANNEL_ID)
-    if not channel:
+    """Auto leaderboard at 23:55 IST - shows today's TOP 5 data before reset (per guild)"""
+    if not mongo_connected and not leaderboards_ready:
         return
-    try:
-        now_ist = datetime.datetime.now(KOLKATA)
-        docs = safe_find(users_coll, {})
-        active = []
-        for doc in docs:
-            data = doc.get("data", {})
-            cam_on = data.get("voice_cam_on_minutes", 0)
-            cam_off = data.get("voice_cam_off_minutes", 0)
+    # Counters are flushed every few minutes; bring today's totals fully up to date first
+    await flush_study_stats()
+    for state in guilds.states():
+        guild = bot.get_guild(state.guild_id)
+        if not guild:
+            continue
+        channel = guild.get_channel(state.config.auto_lb_channel_id)
+        if not channel:
+            continue
+        try:
+            boards = []
+            for field in (CAM_ON_FIELD, CAM_OFF_FIELD):
+                # Top-K with some headroom because only current members are shown
+                rows = await board_top(guild, field, LB_FETCH_LIMIT)
+                board = []
+                for user_key, mins in rows:
+                    user_id = user_id_of(user_key)
+                    m = guild.get_member(int(user_id)) if user_id.isdigit() else None
+                    if m:
+                        board.append((m.display_name, mins))
+                boards.append(board[:LB_TOP_N])
+            cam_on_data, cam_off_data = boards
             
-            # Skip users with no data (same filter as /lb command)
-            if cam_on == 0 and cam_off == 0:
-                continue
+            leaderboard_text = generate_leaderboard_text(cam_on_data, cam_off_data)
             
-            try:
-                m = guild.get_member(int(doc["_id"]))
-                if m:
-                    active.append({"name": m.display_name, "cam_on": cam_on, "cam_off": cam_off})
-            except Exception:
-                pass
-        
-        sorted_on = sorted(active, key=lambda x: x["cam_on"], reverse=True)
-        sorted_off = sorted(active, key=lambda x: x["cam_off"], reverse=True)
-        
-        # Convert to list of tuples for formatting (include everyone, even 0 minutes)
-        cam_on_data = [(u["name"], u["cam_on"]) for u in sorted_on]
-        cam_off_data = [(u["name"], u["cam_off"]) for u in sorted_off]
-        
-        leaderboard_text = generate_leaderboard_text(cam_on_data, cam_off_data)
-        
-        await channel.send(f"```{leaderboard_text}```")
-        print(f"✅ Auto leaderboard posted at 23:55 IST with TOP 5 performers | Users with data: {len(active)}")
+            await channel.send(f"```{leaderboard_text}```")
+            print(f"✅ Auto leaderboard posted at 23:55 IST in {guild.name} | CAM ON: {len(cam_on_data)}, CAM OFF: {len(cam_off_data)}")
+        except Exception as e:
+            print(f"⚠️ Auto leaderboard error ({guild.name}): {str(e)[:100]}")
+
+ROLLOVER_MAX_RETRIES = 3
+
+
+def _rollover_users(day: str, reset_at: str):
+    """Blocking: roll every user's counters into data.yesterday in one pipeline update.
+
+    Each document is read and rewritten atomically on the server, so an $inc that lands
+    during the rollover counts either for today (copied to yesterday) or for the new day.
+    last_reset_day is the idempotency marker: re-running for the same day is a no-op.
+    The same statement adds the day onto the all-time totals in data.alltime.
+    """
+    return users_coll.update_many(
+        {"last_reset_day": {"$ne": day}},
+        [{"$set": {
+            "data.yesterday.cam_on": {"$ifNull": ["$data.voice_cam_on_minutes", 0]},
+            "data.yesterday.cam_off": {"$ifNull": ["$data.voice_cam_off_minutes", 0]},
+            "data.alltime.cam_on": {"$add": [{"$ifNull": ["$data.alltime.cam_on", 0]}, {"$ifNull": ["$data.voice_cam_on_minutes", 0]}]},
+            "data.alltime.cam_off": {"$add": [{"$ifNull": ["$data.alltime.cam_off", 0]}, {"$ifNull": ["$data.voice_cam_off_minutes", 0]}]},
+            "data.voice_cam_on_minutes": 0,
+            "data.voice_cam_off_minutes": 0,
+            "last_reset": reset_at,
+            "last_reset_day": day,
+        }}]
+    )
+
+
+history_pending_day = None  # closed day whose history save failed, retried until the next rollover
+
+
+async def record_history(day: datetime.date) -> bool:
+    """Write the closed day to daily_stats and refresh its week / month rollups.
+
+    The day is read from data.yesterday, so a failed save stays retryable until the
+    next rollover overwrites it: it is remembered in history_pending_day and retried
+    by mongo_health_monitor and before that rollover (re-running overwrites, see stats_history).
+    """
+    global history_pending_day
+    day_str = day.strftime("%Y-%m-%d")
+    try:
+        await run_mongo(record_day, users_coll, daily_stats_coll, day_str)
+        users = await run_mongo(rollup_periods, daily_stats_coll, period_stats_coll, day)
+        print(f"📚 History saved for {day_str}: {users} users | {week_key(day)} / {month_key(day)} rollups updated")
     except Exception as e:
-        print(f"⚠️ Auto leaderboard error: {str(e)[:100]}")
+        print(f"⚠️ History save error for {day_str}: {str(e)[:100]}")
+        history_pending_day = day
+        return False
+    if history_pending_day == day:
+        history_pending_day = None
+    render_cache.invalidate()  # weekly / monthly / all-time totals just moved
+    return True
+
 
 @tasks.loop(time=datetime.time(23, 59, tzinfo=KOLKATA))
 async def midnight_reset():
@@ -1174,130 +2106,180 @@ async def midnight_reset():
         return
     try:
         now_ist = datetime.datetime.now(KOLKATA)
+        day = now_ist.strftime("%Y-%m-%d")
         print(f"\n{'='*70}")
         print(f"🌙 DAILY RESET INITIATED at {now_ist.strftime('%d/%m/%Y %H:%M:%S IST')}")
         print(f"{'='*70}")
         
-        docs = safe_find(users_coll, {})
-        reset_count = 0
-        
-        for doc in docs:
+        # Land today's buffered minutes and queued writes before they are rolled over
+        await flush_study_stats()
+        if mongo_wal_size:
+            await drain_mongo_replay()
+        # Last chance for a day whose history save failed: the rollover overwrites data.yesterday
+        if history_pending_day and not await record_history(history_pending_day):
+            print(f"⚠️ History for {history_pending_day} could not be saved before the rollover - skipped")
+        
+        for attempt in range(ROLLOVER_MAX_RETRIES):
+            if not mongo_breaker.allow():
+                print(f"⚠️ Daily reset skipped: Mongo circuit breaker {mongo_breaker.state}")
+                return
             try:
-                data = doc.get("data", {})
-                cam_on_today = data.get("voice_cam_on_minutes", 0)
-                cam_off_today = data.get("voice_cam_off_minutes", 0)
-                
-                # Preserve today's data to yesterday, then reset today's counters
-                result = safe_update_one(users_coll, {"_id": doc["_id"]}, {"$set": {
-                    "data.yesterday.cam_on": cam_on_today,
-                    "data.yesterday.cam_off": cam_off_today,
-                    "data.voice_cam_on_minutes": 0,
-                    "data.voice_cam_off_minutes": 0,
-                    "last_reset": now_ist.isoformat()
-                }})
-                if result:
-                    reset_count += 1
-                    print(f"   ✅ {doc['_id']}: {format_time(cam_on_today)} ON → Yesterday | Reset today's counters")
+                result = await run_mongo(_rollover_users, day, now_ist.isoformat())
+                _on_mongo_success()
+                break
             except Exception as e:
-                print(f"   ⚠️ Error resetting {doc.get('_id', 'unknown')}: {str(e)[:60]}")
+                _on_mongo_failure()
+                print(f"⚠️ Daily reset attempt {attempt + 1} failed: {str(e)[:80]}")
+                if attempt == ROLLOVER_MAX_RETRIES - 1:
+                    return
+                await asyncio.sleep(backoff_delay(attempt))
         
-        print(f"\n🌙 Daily Reset Complete: {reset_count} users reset")
+        print(f"\n🌙 Daily Reset Complete: {result.modified_count} users reset for {day}")
+        await rebuild_leaderboards()
+        await record_history(now_ist.date())
         print(f"📊 New data collection cycle starts now at {now_ist.strftime('%H:%M:%S IST')}")
         print(f"{'='*70}\n")
     except Exception as e:
         print(f"⚠️ Midnight reset error: {str(e)[:100]}")
 
+# ==================== LEADERBOARD NAME RESOLUTION ====================
+# Last known display name per user_key (LRU, persisted as users.display_name by
+# flush_study_stats). Departed members resolve from it instead of 2 REST calls each;
+# the remaining misses are fetched concurrently, a few at a time, and paused on 429s.
+NAME_CACHE_SIZE = 5000
+NAME_FETCH_CONCURRENCY = 4
+NAME_FETCH_BACKOFF = 30  # seconds without REST lookups after a 429 with no retry_after
+name_cache = NameCache(maxsize=NAME_CACHE_SIZE)
+name_fetch_semaphore = asyncio.Semaphore(NAME_FETCH_CONCURRENCY)
+name_fetch_paused_until = 0.0
+
+
+def pause_name_fetches(error: Exception) -> bool:
+    """Back off REST name lookups after a rate limit. Returns True if `error` was one."""
+    global name_fetch_paused_until
+    if isinstance(error, discord.RateLimited):
+        delay = error.retry_after
+    elif isinstance(error, discord.HTTPException) and error.status == 429:
+        delay = NAME_FETCH_BACKOFF
+    else:
+        return False
+    name_fetch_paused_until = max(name_fetch_paused_until, time.monotonic() + delay)
+    print(f"⏳ Name lookups rate limited - pausing REST fetches for {delay:.0f}s")
+    return True
+
+
+async def fetch_display_name(guild: discord.Guild, user_id: int):
+    """(name, source) from the member API, then the user API; None if both fail"""
+    async with name_fetch_semaphore:
+        if time.monotonic() < name_fetch_paused_until:
+            return None
+        try:
+            m = await guild.fetch_member(user_id)
+            return m.display_name, "api"
+        except Exception as e:
+            if pause_name_fetches(e):
+                return None
+        # User not in guild anymore - try to fetch user data directly
+        try:
+            user = await bot.fetch_user(user_id)
+            return user.name, "user_api"
+        except Exception as e:
+            pause_name_fetches(e)
+            return None
+
+
+async def resolve_display_name(guild: discord.Guild, user_id: int):
+    """Display name for a leaderboard user: guild cache, name cache, then member / user API, then ID"""
+    key = guilds.user_key(guild.id, user_id)
+    m = guild.get_member(user_id)
+    if m:
+        name_cache.put(key, m.display_name)
+        return m.display_name, "cache"
+    name = name_cache.get(key)
+    if name:
+        return name, "name_cache"
+    fetched = await fetch_display_name(guild, user_id)
+    if fetched:
+        name_cache.put(key, fetched[0])
+        return fetched
+    # Last resort - use ID as display name
+    return f"[{user_id}]", "fallback"
+
+
+async def flush_display_names():
+    """Persist names changed since the last flush onto the users' stat documents"""
+    dirty = name_cache.take_dirty()
+    # Only members with a stats document; never create one just for a name
+    ops = [UpdateOne({"_id": key}, {"$set": {"display_name": name}}) for key, name in dirty.items() if key in known_user_ids]
+    if ops and not await safe_bulk_write(users_coll, ops):
+        name_cache.restore_dirty(dirty)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    """Nickname changes refresh the leaderboard name cache"""
+    if after.guild.id in guilds and before.display_name != after.display_name:
+        name_cache.put(guilds.user_key(after.guild.id, after.id), after.display_name)
+
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User):
+    """Username / global name changes show in every served guild where there is no nickname"""
+    if before.name == after.name and before.global_name == after.global_name:
+        return
+    for state in guilds.states():
+        guild = bot.get_guild(state.guild_id)
+        member = guild.get_member(after.id) if guild else None
+        if member:
+            name_cache.put(guilds.user_key(guild.id, after.id), member.display_name)
+
+
+def guild_scope(guild: discord.Guild) -> dict:
+    """Leaderboard query filter for one guild's documents"""
+    return {"guild_id": guild.id}
+
+
+async def board_names(guild: discord.Guild, rows, label: str):
+    """Turn [(user_key, minutes)] rows into [(display_name, minutes)], skipping invalid IDs.
+
+    Names are resolved concurrently; only cache misses reach the (bounded) REST lookups.
+    """
+    valid = []
+    for user_key, mins in rows:
+        user_id_str = user_id_of(user_key).strip()
+        # Skip invalid IDs (like "mongodb_test")
+        if not user_id_str.isdigit():
+            print(f"   ⚠️ Skipping invalid ID: {user_id_str}")
+            continue
+        valid.append((int(user_id_str), mins))
+    resolved = await asyncio.gather(*(resolve_display_name(guild, user_id) for user_id, _ in valid))
+    board = []
+    for (_, mins), (display_name, source) in zip(valid, resolved):
+        board.append((display_name, mins))
+        print(f"   ✅ {display_name}: {label}={mins}min ({source})")
+    return board
+
+
 # Leaderboard commands
 @tree.command(name="lb", description="Today’s voice + cam leaderboard", guild=GUILD)
 @checks.cooldown(1, 10)   # once per 10 sec per user
 async def lb(interaction: discord.Interaction):
     await interaction.response.defer()
     try:
-        if not mongo_connected:
+        cached = render_cache.get(interaction.guild.id, "lb")
+        if cached:
+            return await interaction.followup.send(cached)
+        if not mongo_connected and not leaderboards_ready:
             return await interaction.followup.send("📡 Database temporarily unavailable. Try again in a moment.")
         
-        docs = safe_find(users_coll, {}, limit=100)
-        print(f"🔍 /lb command: Found {len(docs)} total documents in MongoDB")
-        
-        if not docs:
-            print(f"⚠️ No documents found in MongoDB! Showing empty leaderboard.")
-            leaderboard_text = generate_leaderboard_text([], [])
-            await interaction.followup.send(f"```{leaderboard_text}```")
-            return
-        
-        print(f"   ℹ️  Processing {len(docs)} users...")
-        
-        active = []
-        # Build member cache for fast lookups
-        members_by_id = {m.id: m for m in interaction.guild.members}
-        print(f"   Guild has {len(members_by_id)} members in cache")
-
-        for idx, doc in enumerate(docs):
-            try:
-                # Get user ID (handle both string and int)
-                user_id_str = str(doc.get("_id", "")).strip()
-                
-                # Skip invalid IDs (like "mongodb_test")
-                if not user_id_str or not user_id_str.isdigit():
-                    print(f"   ⚠️ Skipping invalid ID: {user_id_str}")
-                    continue
-                
-                user_id = int(user_id_str)
-                data = doc.get("data", {})
-                cam_on = data.get("voice_cam_on_minutes", 0)
-                cam_off = data.get("voice_cam_off_minutes", 0)
-                
-                # Skip users with no data
-                if cam_on == 0 and cam_off == 0:
-                    continue
-                
-                # Try to get member name from guild cache first
-                m = members_by_id.get(user_id)
-                display_name = None
-                
-                if m:
-                    display_name = m.display_name
-                    source = "cache"
-                else:
-                    # Try to fetch member from API
-                    try:
-                        m = await interaction.guild.fetch_member(user_id)
-                        display_name = m.display_name
-                        source = "api"
-                    except Exception:
-                        # User not in guild anymore - try to fetch user data directly
-                        try:
-                            user = await bot.fetch_user(user_id)
-                            display_name = user.name
-                            source = "user_api"
-                        except Exception:
-                            # Last resort - use ID as display name
-                            display_name = f"[{user_id}]"
-                            source = "fallback"
-                
-                if display_name:
-                    active.append({"name": display_name, "cam_on": cam_on, "cam_off": cam_off})
-                    print(f"   ✅ {display_name}: CAM_ON={cam_on}min, CAM_OFF={cam_off}min ({source})")
-                    
-            except Exception as e:
-                print(f"   ⚠️ Error processing doc {idx}: {str(e)[:80]}")
-
-        print(f"   📊 Total active users with data: {len(active)}")
-        
-        if not active:
-            print(f"   ℹ️  No users with study time found")
-            leaderboard_text = generate_leaderboard_text([], [])
-            await interaction.followup.send(f"```{leaderboard_text}```")
-            return
+        # Top-K per board from the in-memory index (indexed query until it is built)
+        boards = []
+        for field in (CAM_ON_FIELD, CAM_OFF_FIELD):
+            rows = await board_top(interaction.guild, field, LB_TOP_N)
+            boards.append(await board_names(interaction.guild, rows, field))
+        cam_on_data, cam_off_data = boards
         
-        sorted_on = sorted(active, key=lambda x: x["cam_on"], reverse=True)
-        sorted_off = sorted(active, key=lambda x: x["cam_off"], reverse=True)
-
-        cam_on_data = [(u["name"], u["cam_on"]) for u in sorted_on]
-        cam_off_data = [(u["name"], u["cam_off"]) for u in sorted_off]
-
-        print(f"   CAM_ON top 3: {cam_on_data[:3]}")
-        print(f"   CAM_OFF top 3: {cam_off_data[:3]}")
+        print(f"🔍 /lb command: CAM_ON top: {cam_on_data[:3]} | CAM_OFF top: {cam_off_data[:3]}")
 
         leaderboard_text = generate_leaderboard_text(cam_on_data, cam_off_data)
         
@@ -1306,7 +2288,11 @@ async def lb(interaction: discord.Interaction):
             await interaction.followup.send("⚠️ Error generating leaderboard text.")
             return
         
-        await interaction.followup.send(f"```{leaderboard_text}```")
+        message = f"```{leaderboard_text}```"
+        # Only boards read from the index are cached: it is what flushes invalidate
+        if leaderboards_ready:
+            render_cache.put(interaction.guild.id, "lb", message)
+        await interaction.followup.send(message)
         print(f"✅ /lb command: leaderboard sent successfully")
     except Exception as e:
         print(f"⚠️ /lb command error: {type(e).__name__}: {str(e)}")
@@ -1322,38 +2308,22 @@ async def rank(interaction: discord.Interaction, member: discord.Member = None):
     """Slash command to show the per-user rank summary.
 
     This command is intentionally implemented as a standalone feature and
-    only reads from the DB; it does not modify any existing structures.
+    only reads; it does not modify any existing structures.
+    Rank and totals come from the in-memory leaderboard index (binary search),
+    or indexed count queries until it is built - never a scan of every user.
     """
     await interaction.response.defer()
     try:
-        if not mongo_connected:
+        if not mongo_connected and not leaderboards_ready:
             return await interaction.followup.send("📡 Database temporarily unavailable. Try again in a moment.")
 
         target = member or interaction.user
+        user_id = guilds.user_key(interaction.guild.id, target.id)
 
-        # Collect today's data (same approach as auto_leaderboard)
-        docs = safe_find(users_coll, {}, limit=1000)
-        active = []
-        for doc in docs:
-            data = doc.get("data", {})
-            try:
-                m = interaction.guild.get_member(int(doc["_id"]))
-                if m:
-                    active.append({
-                        "name": m.display_name,
-                        "cam_on": data.get("voice_cam_on_minutes", 0),
-                        "cam_off": data.get("voice_cam_off_minutes", 0)
-                    })
-            except Exception:
-                continue
-
-        sorted_on = sorted(active, key=lambda x: x["cam_on"], reverse=True)
-        sorted_off = sorted(active, key=lambda x: x["cam_off"], reverse=True)
+        cam_on_rank = await board_rank(interaction.guild, user_id, CAM_ON_FIELD)
+        cam_off_rank = await board_rank(interaction.guild, user_id, CAM_OFF_FIELD)
 
-        cam_on_data = [(u["name"], u["cam_on"]) for u in sorted_on]
-        cam_off_data = [(u["name"], u["cam_off"]) for u in sorted_off]
-
-        summary = user_rank(target.display_name, cam_on_data, cam_off_data)
+        summary = format_rank_summary(target.display_name, cam_on_rank, cam_off_rank)
         # Send as code block for monospaced alignment; public message
         await interaction.followup.send(f"```{summary}```")
     except Exception as e:
@@ -1361,46 +2331,220 @@ async def rank(interaction: discord.Interaction, member: discord.Member = None):
         await interaction.followup.send("⚠️ Failed to generate rank. Try again later.")
 
 
-# Note: `mystatus` and `yst` are implemented later in the file (preserved original versions)
-        
-        for doc in docs:
+async def send_history_board(interaction: discord.Interaction, board: str, title: str, footer: str, on_rows, off_rows):
+    """Render, cache and send a history leaderboard (/wlb, /mlb, /alb) from two top-K row lists"""
+    cam_on_data = await board_names(interaction.guild, on_rows, "cam_on")
+    cam_off_data = await board_names(interaction.guild, off_rows, "cam_off")
+    message = f"```{generate_leaderboard_text(cam_on_data, cam_off_data, title=title, footer=footer)}```"
+    render_cache.put(interaction.guild.id, board, message)
+    await interaction.followup.send(message)
+
+
+async def send_period_board(interaction: discord.Interaction, period: str, title: str):
+    """Leaderboard for one week / month, read from the indexed period_stats rollups"""
+    await interaction.response.defer()
+    try:
+        cached = render_cache.get(interaction.guild.id, period)
+        if cached:
+            return await interaction.followup.send(cached)
+        if not mongo_connected:
+            return await interaction.followup.send("📡 Database temporarily unavailable. Try again in a moment.")
+        scope = guild_scope(interaction.guild)
+        on_rows = await safe_query(top_period_users, period_stats_coll, period, "cam_on", LB_TOP_N, scope, default=[])
+        off_rows = await safe_query(top_period_users, period_stats_coll, period, "cam_off", LB_TOP_N, scope, default=[])
+        footer = f"📅 {period} | completed days, updated at the **11:59 PM** reset\n"
+        await send_history_board(interaction, period, title, footer, on_rows, off_rows)
+    except Exception as e:
+        print(f"⚠️ {title} error: {str(e)[:100]}")
+        await interaction.followup.send(f"⚠️ Failed to generate leaderboard: {str(e)[:100]}")
+
+
+@tree.command(name="wlb", description="This week’s leaderboard", guild=GUILD)
+@checks.cooldown(1, 10)
+async def wlb(interaction: discord.Interaction):
+    await send_period_board(interaction, week_key(datetime.datetime.now(KOLKATA).date()), "Weekly Leaderboard")
+
+
+@tree.command(name="mlb", description="This month’s leaderboard", guild=GUILD)
+@checks.cooldown(1, 10)
+async def mlb(interaction: discord.Interaction):
+    await send_period_board(interaction, month_key(datetime.datetime.now(KOLKATA).date()), "Monthly Leaderboard")
+
+
+@tree.command(name="alb", description="All-time leaderboard", guild=GUILD)
+@checks.cooldown(1, 10)
+async def alb(interaction: discord.Interaction):
+    await interaction.response.defer()
+    try:
+        cached = render_cache.get(interaction.guild.id, "alltime")
+        if cached:
+            return await interaction.followup.send(cached)
+        if not mongo_connected:
+            return await interaction.followup.send("📡 Database temporarily unavailable. Try again in a moment.")
+        scope = guild_scope(interaction.guild)
+        on_rows = await safe_query(top_users, users_coll, ALLTIME_ON_FIELD, LB_TOP_N, scope, default=[])
+        off_rows = await safe_query(top_users, users_coll, ALLTIME_OFF_FIELD, LB_TOP_N, scope, default=[])
+        footer = "📅 All completed days, updated at the **11:59 PM** reset\n"
+        await send_history_board(interaction, "alltime", "All-Time Leaderboard", footer, on_rows, off_rows)
+    except Exception as e:
+        print(f"⚠️ /alb command error: {str(e)[:100]}")
+        await interaction.followup.send(f"⚠️ Failed to generate leaderboard: {str(e)[:100]}")
+
+
+# Full paginated leaderboards (/board). Pages are read with keyset cursors - the
+# (minutes, user_key) of the previous page's last row - so a click costs one bounded
+# indexed query, or a bisect + slice of the in-memory index for today's boards.
+BOARD_PAGE_SIZE = 10
+YESTERDAY_ON_FIELD = "data.yesterday.cam_on"
+YESTERDAY_OFF_FIELD = "data.yesterday.cam_off"
+FULL_BOARDS = {
+    "today_on": ("🎥 Today — Cam On", CAM_ON_FIELD),
+    "today_off": ("📴 Today — Cam Off", CAM_OFF_FIELD),
+    "yesterday_on": ("⏮️ Yesterday — Cam On", YESTERDAY_ON_FIELD),
+    "yesterday_off": ("⏮️ Yesterday — Cam Off", YESTERDAY_OFF_FIELD),
+    "alltime_on": ("🏛️ All Time — Cam On", ALLTIME_ON_FIELD),
+    "alltime_off": ("🏛️ All Time — Cam Off", ALLTIME_OFF_FIELD),
+}
+
+
+def board_index(guild: discord.Guild, field: str):
+    """The in-memory BoardIndex for a daily board, or None if it must come from MongoDB"""
+    state = guilds.get(guild.id)
+    if leaderboards_ready and state:
+        return state.boards.get(field)
+    return None
+
+
+async def board_page(guild: discord.Guild, field: str, limit: int, after=None):
+    index = board_index(guild, field)
+    if index is not None:
+        return index.page(limit, after)
+    return await safe_query(page_users, users_coll, field, limit, after, guild_scope(guild), default=[])
+
+
+async def board_total(guild: discord.Guild, field: str) -> int:
+    index = board_index(guild, field)
+    if index is not None:
+        return len(index)
+    return await safe_query(count_ranked, users_coll, field, guild_scope(guild), default=0)
+
+
+class LeaderboardPager(discord.ui.View):
+    """Prev / Next buttons over one board; only the member who ran /board can page."""
+
+    def __init__(self, owner_id: int, guild: discord.Guild, board: str, total: int):
+        super().__init__(timeout=180)
+        self.owner_id = owner_id
+        self.guild = guild
+        self.title, self.field = FULL_BOARDS[board]
+        self.total = total
+        # Per page: (cursor, rows before it, rank and minutes of the row before it) - ties carry over pages
+        self.pages = [(None, 0, 0, None)]
+        self.page = 0
+        self.ranked = []
+        self.message = None
+
+    async def load(self):
+        """Fetch the current page (one bounded read) and assign competition ranks"""
+        cursor, offset, prev_rank, prev_minutes = self.pages[self.page]
+        rows = await board_page(self.guild, self.field, BOARD_PAGE_SIZE + 1, cursor)
+        has_next = len(rows) > BOARD_PAGE_SIZE
+        rows = rows[:BOARD_PAGE_SIZE]
+        self.ranked = []
+        for i, (user_key, mins) in enumerate(rows):
+            rank = prev_rank if mins == prev_minutes else offset + i + 1
+            self.ranked.append((rank, user_key, mins))
+            prev_rank, prev_minutes = rank, mins
+        if has_next and len(self.pages) == self.page + 1:
+            last_key, last_mins = rows[-1]
+            self.pages.append(((last_mins, last_key), offset + len(rows), prev_rank, prev_minutes))
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = not has_next
+
+    async def render(self) -> discord.Embed:
+        valid = [(rank, int(user_id_of(key)), mins) for rank, key, mins in self.ranked if user_id_of(key).isdigit()]
+        names = await asyncio.gather(*(resolve_display_name(self.guild, user_id) for _, user_id, _ in valid))
+        lines = []
+        for (rank, user_id, mins), (name, _) in zip(valid, names):
+            marker = "👉 " if user_id == self.owner_id else ""
+            lines.append(f"{marker}{get_medal_emoji(rank)} #{rank} **{name}** — {format_time(mins)}")
+        embed = discord.Embed(title=self.title, description="\n".join(lines) or "📚 Nobody on this board yet.", color=0xF1C40F)
+        pages = max(1, -(-self.total // BOARD_PAGE_SIZE))
+        embed.set_footer(text=f"Page {self.page + 1}/{pages} • {self.total} ranked")
+        return embed
+
+    async def show(self, interaction: discord.Interaction, step: int):
+        await interaction.response.defer()
+        self.page += step
+        await self.load()
+        await interaction.edit_original_response(embed=await self.render(), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("Run `/board` to page through your own copy.", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
             try:
-                # Skip the test document created during startup
-                if doc["_id"] == "mongodb_test":
-                    continue
-                    
-                user_id = int(doc["_id"])
-                member = members_by_id.get(user_id)
-                if not member:
-                    continue
-                data = doc.get("data", {})
-                cam_on = data.get("voice_cam_on_minutes", 0)
-                cam_off = data.get("voice_cam_off_minutes", 0)
-                total = cam_on + cam_off
-                print(f"   - {member.display_name}: Cam ON {cam_on}m, Cam OFF {cam_off}m (Total: {total}m)")
-                if cam_on > 0 or cam_off > 0:
-                    active.append({"name": member.display_name, "cam_on": cam_on, "cam_off": cam_off})
-            except (ValueError, KeyError) as e:
-                print(f"   ⚠️ Error processing doc: {e}")
-                continue
-        
-        print(f"   ✅ Processed {len(docs)} documents, {len(active)} have data")
-        sorted_on = sorted(active, key=lambda x: x["cam_on"], reverse=True)[:15]  # TOP 15 CAM ON
-        sorted_off = sorted(active, key=lambda x: x["cam_off"], reverse=True)[:10]  # TOP 10 CAM OFF
-        
-        # ✨ Beautiful Leaderboard Design
-        cam_on_data = [(u["name"], u["cam_on"]) for u in sorted_on]
-        cam_off_data = [(u["name"], u["cam_off"]) for u in sorted_off]
-        
-        leaderboard_text = generate_leaderboard_text(cam_on_data, cam_off_data)
-        
-        await interaction.followup.send(f"```{leaderboard_text}```")
+                await self.message.edit(view=self)
+            except Exception:
+                pass
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, -1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, 1)
+
+
+@tree.command(name="board", description="Full leaderboard, 10 per page", guild=GUILD)
+@app_commands.describe(board="Which board (default: today, cam on)")
+@app_commands.choices(board=[app_commands.Choice(name=title, value=key) for key, (title, _) in FULL_BOARDS.items()])
+@checks.cooldown(1, 10)
+async def board(interaction: discord.Interaction, board: app_commands.Choice[str] = None):
+    await interaction.response.defer()
+    try:
+        key = board.value if board else "today_on"
+        if not mongo_connected and board_index(interaction.guild, FULL_BOARDS[key][1]) is None:
+            return await interaction.followup.send("📡 Database temporarily unavailable. Try again in a moment.")
+        total = await board_total(interaction.guild, FULL_BOARDS[key][1])
+        view = LeaderboardPager(interaction.user.id, interaction.guild, key, total)
+        await view.load()
+        view.message = await interaction.followup.send(embed=await view.render(), view=view, wait=True)
     except Exception as e:
-        error_msg = str(e)
-        if "SSL" in error_msg or "handshake" in error_msg:
-            await interaction.followup.send("📡 Database connection issue. Please try again later.")
-        else:
-            await interaction.followup.send(f"Error loading leaderboard: {str(e)[:100]}")
+        print(f"⚠️ /board command error: {str(e)[:100]}")
+        await interaction.followup.send(f"⚠️ Failed to load leaderboard: {str(e)[:100]}")
+
+
+@tree.command(name="live", description="Who is studying in voice right now", guild=GUILD)
+@checks.cooldown(1, 10)
+async def live(interaction: discord.Interaction):
+    """Answered from the in-memory occupancy index - no Discord cache walk, no DB"""
+    state = guilds.get(interaction.guild.id)
+    if not state:
+        return await interaction.response.send_message("⚠️ This server is not configured.", ephemeral=True)
+    snap = state.voice_occupancy.snapshot()
+    embed = discord.Embed(
+        title="🔴 Live Study Rooms",
+        description=f"👥 **{snap['in_voice']}** in voice | 🎥 **{snap['cam_on']}** cam on | ❌ **{snap['cam_off']}** cam off | 🖥️ **{snap['streaming']}** sharing",
+        color=0xE74C3C
+    )
+    for channel in snap["channels"][:25]:
+        lines = []
+        for m in channel["members"]:
+            icons = ("🎥" if m["cam"] else "❌") + (" 🖥️" if m["stream"] else "")
+            lines.append(f"{icons} **{m['name']}** — {format_time(m['seconds'] // 60)}")
+        embed.add_field(name=f"🔊 {channel['name']} ({len(channel['members'])})", value=truncate_embed_field("\n".join(lines)), inline=False)
+    if not snap["channels"]:
+        embed.add_field(name="Empty", value="📚 Nobody is in voice right now.", inline=False)
+    await interaction.response.send_message(embed=embed)
+
 
 @tree.command(name="ylb", description="Yesterday’s leaderboard", guild=GUILD)
 async def ylb(interaction: discord.Interaction):
@@ -1409,13 +2553,17 @@ async def ylb(interaction: discord.Interaction):
         if not mongo_connected:
             return await interaction.followup.send("📡 Database temporarily unavailable. Try again in a moment.")
         
-        docs = safe_find(users_coll, {"data.yesterday": {"$exists": True}})
+        docs = await safe_find(
+            users_coll,
+            {**guild_scope(interaction.guild), "$or": [{"data.yesterday.cam_on": {"$gt": 0}}, {"data.yesterday.cam_off": {"$gt": 0}}]},
+            projection={"data.yesterday": 1}
+        )
         active = []
         # Use guild.members cache instead of fetching (faster)
         members_by_id = {m.id: m for m in interaction.guild.members}
         for doc in docs:
             try:
-                user_id = int(doc["_id"])
+                user_id = int(user_id_of(doc["_id"]))
                 member = members_by_id.get(user_id)
                 if not member:
                     continue
@@ -1443,7 +2591,12 @@ async def mystatus(interaction: discord.Interaction):
     await interaction.response.defer()
 
     try:
-        doc = safe_find_one(users_coll, {"_id": str(interaction.user.id)})
+        user_id = guilds.user_key(interaction.guild.id, interaction.user.id)
+        doc = await safe_find_one(users_coll, {"_id": user_id}, projection={"data.voice_cam_on_minutes": 1, "data.voice_cam_off_minutes": 1, "data.alltime": 1})
+        today = datetime.datetime.now(KOLKATA).date()
+        week, month = week_key(today), month_key(today)
+        periods = await safe_query(user_period_totals, period_stats_coll, user_id, [week, month], default={})
+        recent = await safe_query(user_recent_days, daily_stats_coll, user_id, 7, default=[])
     except Exception as e:
         await interaction.followup.send(f"DB Error: {e}")
         return
@@ -1462,6 +2615,15 @@ async def mystatus(interaction: discord.Interaction):
     embed.add_field(name="Cam On", value=format_time(data.get("voice_cam_on_minutes", 0)))
     embed.add_field(name="Cam Off", value=format_time(data.get("voice_cam_off_minutes", 0)))
 
+    # History: rollups hold completed days only, so today's live minutes are added on top
+    for label, totals in (("This Week", periods.get(week, (0, 0))), ("This Month", periods.get(month, (0, 0)))):
+        embed.add_field(name=label, value=format_time(sum(totals) + total))
+    alltime = data.get("alltime", {})
+    embed.add_field(name="All Time", value=format_time(alltime.get("cam_on", 0) + alltime.get("cam_off", 0) + total))
+    if recent:
+        trend = "\n".join(f"`{day}` {format_time(on + off)} (✅ {format_time(on)})" for day, on, off in recent)
+        embed.add_field(name="Last 7 Days", value=truncate_embed_field(trend), inline=False)
+
     await interaction.followup.send(embed=embed)
 
 
@@ -1470,7 +2632,7 @@ async def mystatus(interaction: discord.Interaction):
 async def yst(interaction: discord.Interaction):
     await interaction.response.defer()
     try:
-        doc = safe_find_one(users_coll, {"_id": str(interaction.user.id)})
+        doc = await safe_find_one(users_coll, {"_id": guilds.user_key(interaction.guild.id, interaction.user.id)}, projection={"data.yesterday": 1})
         if not doc or "data" not in doc or "yesterday" not in doc["data"]:
             return await interaction.followup.send("No yesterday data.")
         y = doc["data"]["yesterday"]
@@ -1493,7 +2655,7 @@ async def redban(interaction: discord.Interaction, userid: str):
             return await interaction.followup.send("Owner only")
         if not userid.isdigit():
             return await interaction.followup.send("Invalid ID")
-        safe_update_one(redlist_coll, {"_id": userid}, {"$set": {"added": datetime.datetime.now(KOLKATA)}})
+        await safe_update_one(redlist_coll, {"_id": userid}, {"$set": {"added": datetime.datetime.now(KOLKATA)}})
         try:
             await interaction.guild.ban(discord.Object(id=int(userid)), reason="Redlist")
         except Exception as e:
@@ -1508,7 +2670,7 @@ async def redlist(interaction: discord.Interaction):
     try:
         if interaction.user.id != OWNER_ID:
             return await interaction.followup.send("Owner only")
-        ids = [doc["_id"] for doc in safe_find(redlist_coll, {})]
+        ids = [doc["_id"] for doc in await safe_find(redlist_coll, {}, projection={"_id": 1})]
         if not ids:
             return await interaction.followup.send("Empty redlist.")
         msg = "Redlist IDs:\n" + "\n".join(f"- {i}" for i in ids)
@@ -1528,12 +2690,12 @@ async def removeredban(interaction: discord.Interaction, userid: str):
             return await interaction.followup.send("Invalid ID format", ephemeral=True)
         
         # Check if user exists in redlist
-        user_doc = safe_find_one(redlist_coll, {"_id": userid})
+        user_doc = await safe_find_one(redlist_coll, {"_id": userid}, projection={"_id": 1})
         if not user_doc:
             return await interaction.followup.send(f"User {userid} not found in redlist", ephemeral=True)
         
         # Remove from redlist
-        safe_delete_one(redlist_coll, {"_id": userid})
+        await safe_delete_one(redlist_coll, {"_id": userid})
         
         # Try to unban the user
         try:
@@ -1553,9 +2715,7 @@ async def on_member_join(member: discord.Member):
     if member.guild.id != GUILD_ID:
         return
     now = time.time()
-    join_times[member.guild.id].append(now)
-    join_times[member.guild.id] = [t for t in join_times[member.guild.id] if now - t < RAID_WINDOW]
-    if len(join_times[member.guild.id]) > RAID_THRESHOLD:
+    if raid_window.hit(member.guild.id) > RAID_THRESHOLD:
         await lockdown_guild(member.guild)
         tech_channel = bot.get_channel(TECH_CHANNEL_ID)
         if tech_channel:
@@ -1567,7 +2727,7 @@ async def on_member_join(member: discord.Member):
                     await m.ban(reason="Raid protection")
                 except Exception:
                     pass
-    if safe_find_one(redlist_coll, {"_id": str(member.id)}):
+    if await safe_find_one(redlist_coll, {"_id": str(member.id)}, projection={"_id": 1}):
         try:
             await member.ban(reason="Redlist")
         except Exception:
@@ -1662,7 +2822,7 @@ async def todo(
     uid = str(interaction.user.id)
     
     # Auth check
-    if not safe_find_one(active_members_coll, {"_id": uid}) and interaction.user.id != OWNER_ID:
+    if not await safe_find_one(active_members_coll, {"_id": uid}, projection={"_id": 1}) and interaction.user.id != OWNER_ID:
         await interaction.followup.send("❌ Not authorized", ephemeral=True)
         return
     
@@ -1729,7 +2889,7 @@ async def todo(
     if attachment_data:
         todo_data["attachment"] = attachment_data
     
-    safe_update_one(todo_coll, {"_id": uid}, {
+    await safe_update_one(todo_coll, {"_id": uid}, {
         "$set": {
             "last_submit": time.time(),
             "last_ping": 0,
@@ -1805,7 +2965,7 @@ async def atodo(
     uid = str(user.id)
     
     # Target auth check
-    if not safe_find_one(active_members_coll, {"_id": uid}):
+    if not await safe_find_one(active_members_coll, {"_id": uid}, projection={"_id": 1}):
         await interaction.followup.send(f"❌ {user.mention} not authorized", ephemeral=True)
         return
     
@@ -1871,7 +3031,7 @@ async def atodo(
     if attachment_data:
         todo_data["attachment"] = attachment_data
     
-    safe_update_one(todo_coll, {"_id": uid}, {
+    await safe_update_one(todo_coll, {"_id": uid}, {
         "$set": {
             "last_submit": time.time(),
             "last_ping": 0,
@@ -1934,7 +3094,7 @@ async def todo_checker():
     three_hours = 3 * 3600
     five_days = 5 * 86400
     
-    for doc in safe_find(todo_coll, {}):
+    async for doc in safe_find_iter(todo_coll, {}, projection={"last_submit": 1, "last_ping": 1}):
         try:
             uid = int(doc["_id"])
             member = guild.get_member(uid)
@@ -1975,7 +3135,7 @@ async def todo_checker():
                     pass
                 
                 # Update ping timestamp
-                safe_update_one(todo_coll, {"_id": str(uid)}, {"$set": {"last_ping": now}})
+                await safe_update_one(todo_coll, {"_id": str(uid)}, {"$set": {"last_ping": now}})
         except Exception:
             pass
 
@@ -1991,7 +3151,7 @@ async def listtodo(interaction: discord.Interaction):
     """View your current TODO submission"""
     await interaction.response.defer(ephemeral=True)
     try:
-        doc = safe_find_one(todo_coll, {"_id": str(interaction.user.id)})
+        doc = await safe_find_one(todo_coll, {"_id": str(interaction.user.id)}, projection={"todo": 1})
         if not doc or "todo" not in doc:
             return await interaction.followup.send("No TODO submitted yet. Use `/todo`", ephemeral=True)
         
@@ -2022,7 +3182,7 @@ async def deltodo(interaction: discord.Interaction):
     """Delete your current TODO submission"""
     await interaction.response.defer(ephemeral=True)
     try:
-        result = safe_delete_one(todo_coll, {"_id": str(interaction.user.id)})
+        result = await safe_delete_one(todo_coll, {"_id": str(interaction.user.id)})
         if result:
             await interaction.followup.send("✅ TODO deleted", ephemeral=True)
         else:
@@ -2044,7 +3204,7 @@ async def todostatus(interaction: discord.Interaction, user: discord.Member = No
         return await interaction.followup.send("❌ Owner only", ephemeral=True)
     
     try:
-        doc = safe_find_one(todo_coll, {"_id": str(target.id)})
+        doc = await safe_find_one(todo_coll, {"_id": str(target.id)}, projection={"last_submit": 1})
         last_submit = doc.get("last_submit", 0) if doc else 0
         
         now = time.time()
@@ -2219,7 +3379,7 @@ async def ud(interaction: discord.Interaction, target: discord.Member):
         user_id = str(target.id)
         
         # Fetch MongoDB data
-        user_doc = safe_find_one(users_coll, {"_id": user_id})
+        user_doc = await safe_find_one(users_coll, {"_id": user_id})
         data = user_doc.get("data", {}) if user_doc else {}
         
         print(f"🔍 /ud query for {target.display_name} (ID: {user_id})")
@@ -2406,7 +3566,7 @@ async def addh(interaction: discord.Interaction, userid: str):
         print(f"   Member found: {member.name if member else 'None'}")
         
         # Add to active members - use STRING format like the todo check expects
-        result = safe_update_one(active_members_coll, {"_id": user_id_str}, {
+        result = await safe_update_one(active_members_coll, {"_id": user_id_str}, {
             "$set": {
                 "added": datetime.datetime.now(KOLKATA),
                 "name": member.display_name if member else f"User {user_id}",
@@ -2416,7 +3576,7 @@ async def addh(interaction: discord.Interaction, userid: str):
         print(f"   Database update result: {result}")
         
         # Verify it was actually saved
-        verify = safe_find_one(active_members_coll, {"_id": user_id_str})
+        verify = await safe_find_one(active_members_coll, {"_id": user_id_str})
         print(f"   Verification lookup by '{user_id_str}': {verify}")
         print(f"{'='*70}\n")
         
@@ -2466,15 +3626,15 @@ async def remh(interaction: discord.Interaction, userid: str):
         print(f"   Member found: {member.name if member else 'None'}")
         
         # Check if user exists before removing
-        existing = safe_find_one(active_members_coll, {"_id": user_id_str})
+        existing = await safe_find_one(active_members_coll, {"_id": user_id_str})
         print(f"   Found in database: {existing}")
         
         # Remove from active members
-        safe_delete_one(active_members_coll, {"_id": user_id_str})
+        await safe_delete_one(active_members_coll, {"_id": user_id_str})
         print(f"   Deletion executed")
         
         # Verify it was actually removed
-        verify = safe_find_one(active_members_coll, {"_id": user_id_str})
+        verify = await safe_find_one(active_members_coll, {"_id": user_id_str})
         print(f"   Verification after delete: {verify}")
         print(f"{'='*70}\n")
         
@@ -2502,7 +3662,7 @@ async def members(interaction: discord.Interaction):
     try:
         if interaction.user.id != OWNER_ID:
             return await interaction.followup.send("Owner only", ephemeral=True)
-        ids = [doc["_id"] for doc in safe_find(active_members_coll, {})]
+        ids = [doc["_id"] for doc in await safe_find(active_members_coll, {}, projection={"_id": 1})]
         if not ids:
             return await interaction.followup.send("No active members.", ephemeral=True)
         guild = interaction.guild
@@ -2527,10 +3687,10 @@ async def tododebug(interaction: discord.Interaction):
         user_id_str = str(interaction.user.id)
         
         # Check if user is in active members
-        user_doc = safe_find_one(active_members_coll, {"_id": user_id_str})
+        user_doc = await safe_find_one(active_members_coll, {"_id": user_id_str}, projection={"_id": 1})
         
         # Get all active members
-        all_members = safe_find(active_members_coll, {})
+        all_members = await safe_find(active_members_coll, {}, projection={"name": 1})
         
         msg = f"""
 🔍 **TODO System Debug Info**
@@ -2546,7 +3706,7 @@ async def tododebug(interaction: discord.Interaction):
             msg += f"\n- ID: `{doc['_id']}` | Name: {doc.get('name', 'Unknown')}"
         
         # Show collection stats
-        all_todo = safe_find(todo_coll, {})
+        all_todo = await safe_find(todo_coll, {}, projection={"todo.name": 1})
         msg += f"\n\n**TODO Submissions ({len(all_todo)}):**"
         for doc in all_todo:
             msg += f"\n- ID: `{doc['_id']}` | Name: {doc.get('todo', {}).get('name', 'Unknown')}"
@@ -2617,10 +3777,11 @@ async def on_message(message: discord.Message):
     
     # Allow messages from different guilds ONLY if they're being forwarded (handled above)
     if message.guild and message.guild.id != GUILD_ID:
+        # Other managed guilds only get study stats; moderation stays on the primary guild
+        if message.guild.id in guilds and not message.author.bot:
+            await journal_stat_delta(guilds.user_key(message.guild.id, message.author.id), "data.message_count", 1)
         return
     
-    now = time.time()
-    
     # ==================== SPY MESSAGE TRACKING ====================
     if not message.author.bot:
         try:
@@ -2744,24 +3905,12 @@ async def on_message(message: discord.Message):
                 except Exception as e:
                     print(f"Failed to ban file uploader: {e}")
     
-    # Track message activity in MongoDB - SAVE IMMEDIATELY
+    # Track message activity - coalesced in memory + journaled, flushed in bulk by batch_save_study
     if message.guild and message.guild.id == GUILD_ID:
         user_id = str(message.author.id)
         try:
-            # Use separate operations to avoid MongoDB conflicts
-            # First, increment message count (no setOnInsert conflict)
-            result = save_with_retry(users_coll, {"_id": user_id}, {
-                "$inc": {"data.message_count": 1},
-                "$setOnInsert": {
-                    "data.voice_cam_on_minutes": 0,
-                    "data.voice_cam_off_minutes": 0,
-                    "data.yesterday.cam_on": 0,
-                    "data.yesterday.cam_off": 0
-                }
-            })
+            await journal_stat_delta(user_id, "data.message_count", 1)
             track_activity(message.author.id, f"Message in #{message.channel.name}: {message.content[:50]}")
-            if not result:
-                print(f"⚠️ Failed to save message count for {message.author.display_name}")
         except Exception as e:
             print(f"⚠️ Message tracking error: {str(e)[:80]}")
     
@@ -2779,10 +3928,8 @@ async def on_message(message: discord.Message):
         return
     
     # 1. Anti-Spam
-    spam_cache[message.author.id].append(now)
-    spam_cache[message.author.id] = [t for t in spam_cache[message.author.id] if now - t < SPAM_WINDOW]
-    if len(spam_cache[message.author.id]) > SPAM_THRESHOLD:
-        del spam_cache[message.author.id] # Clear to prevent double strike
+    if spam_window.hit(message.author.id) > SPAM_THRESHOLD:
+        spam_window.reset(message.author.id) # Clear to prevent double strike
         await punish_human(message, "Excessive Spamming") # -> Calls the Brain
         return
     
@@ -3507,6 +4654,19 @@ async def ok_command(interaction: discord.Interaction):
 
 
 # ==================== STARTUP ====================
+async def setup_hook():
+    """Runs once, before the gateway connects - local state is loaded before any event arrives"""
+    # Initialize SQLite spy database
+    await init_spy_db()
+    
+    # Recover counters and MongoDB writes journaled but not flushed before the last shutdown.
+    # Doing it here (not in on_ready) matters: messages dispatched while guilds are still
+    # chunking are already queued and journaled, and would be loaded a second time.
+    await load_stat_journal()
+    await load_wal_size()
+
+bot.setup_hook = setup_hook
+
 @bot.event
 async def on_ready():
     print(f"\n{'='*70}")
@@ -3519,26 +4679,16 @@ async def on_ready():
     print(f"IST Timezone: {datetime.datetime.now(KOLKATA).strftime('%d/%m/%Y %H:%M:%S')}")
     print(f"Commands in tree before sync: {[c.name for c in tree.get_commands(guild=GUILD if GUILD_ID > 0 else None)]}")
     
-    # Verify MongoDB connection
+    # Connect to MongoDB in the background - commands run in degraded mode until it is up
     if not mongo_connected:
-        print("⚠️ WARNING: MongoDB is not connected. Data will be lost on restart!")
-        print("⚠️ Please check your MONGODB_URI in .env file")
-    else:
-        try:
-            # Test MongoDB by writing a test record
-            test_result = save_with_retry(users_coll, {"_id": "mongodb_test"}, {"$set": {"test": True}})
-            if test_result:
-                print("✅ MongoDB test write successful - Data persistence enabled!")
-            else:
-                print("⚠️ MongoDB write test failed")
-        except Exception as e:
-            print(f"⚠️ MongoDB test failed: {e}")
+        print("📡 MongoDB connecting in background (degraded mode until connected)")
+    start_mongo_connect()
     
-    # Initialize SQLite spy database
-    await init_spy_db()
-    
-    # Create indexes on first ready
-    await create_indexes_async()
+    # Voice tracking is event-driven; take one snapshot for whoever is already in voice
+    guild = bot.get_guild(GUILD_ID) if GUILD_ID > 0 else None
+    if guild:
+        reconcile_voice_sessions(guild)
+        reconcile_cam_enforcement(guild)
     
     try:
         if GUILD_ID > 0:
@@ -3553,14 +4703,24 @@ async def on_ready():
         import traceback
         traceback.print_exc()
     
+    # Guilds added from guild_configs before we were ready (the primary was handled above)
+    for guild_id in guilds.ids():
+        if guild_id != GUILD_ID:
+            await setup_guild(guild_id)
+    if mongo_connected:
+        await restore_cam_deadlines()
+    
     print(f"\n📊 Starting Background Tasks:")
-    print(f"   🕐 batch_save_study: Every 30 seconds")
+    print(f"   🕐 batch_save_study: Every {VOICE_TICK_SECONDS}s (MongoDB flush every {STAT_FLUSH_INTERVAL}s)")
     print(f"   📍 auto_leaderboard_ping: Daily at 23:55 IST")
     print(f"   🏆 auto_leaderboard: Daily at 23:55 IST")
     print(f"   🌙 midnight_reset: Daily at 23:59 IST")
     print(f"   ⏰ todo_checker: Every 3 hours")
     print(f"   🔗 clean_webhooks: Every 5 minutes")
     print(f"   📋 monitor_audit: Every 1 minute")
+    print(f"   🩺 mongo_health_monitor: Every {MONGO_HEALTH_INTERVAL} seconds")
+    print(f"   🎥 cam_enforcer: Every {CAM_ENFORCE_TICK} seconds ({cam_deadlines.pending} pending)")
+    print(f"   🧹 sweep_rate_limiters: Every 10 minutes")
     print(f"{'='*70}\n")
     
     batch_save_study.start()
@@ -3570,13 +4730,51 @@ async def on_ready():
     todo_checker.start()
     clean_webhooks.start()
     monitor_audit.start()
+    mongo_health_monitor.start()
+    cam_enforcer.start()
+    sweep_rate_limiters.start()
+
+@bot.event
+async def on_resumed():
+    """Gateway session resumed - re-sync voice sessions in case events were dropped"""
+    for guild_id in guilds.ids():
+        guild = bot.get_guild(guild_id)
+        if guild:
+            reconcile_voice_sessions(guild)
+            reconcile_cam_enforcement(guild)
+    # Persist the countdowns the reconcile started (and drop the ones it ended); while
+    # Mongo is down, on_mongo_connected does this when it comes back
+    if mongo_connected:
+        await restore_cam_deadlines()
 
 # Keep-alive
 async def handle(_):
     return web.Response(text="LegendBot Online! 🦚")
 
+async def handle_health(_):
+    return web.json_response({
+        "bot_ready": bot.is_ready(),
+        "mongo": mongo_health_snapshot(),
+        "cam_deadlines_pending": cam_deadlines.pending,
+        "leaderboards_ready": leaderboards_ready,
+        "render_cache": render_cache.stats(),
+        "name_cache": len(name_cache),
+        "voice_events": dict(voice_event_stats),
+    })
+
+async def handle_live(request):
+    """Occupancy snapshot per guild id, or just one guild with ?guild=<id>"""
+    wanted = request.query.get("guild")
+    return web.json_response({
+        str(state.guild_id): state.voice_occupancy.snapshot()
+        for state in guilds.states()
+        if not wanted or str(state.guild_id) == wanted
+    })
+
 app = web.Application()
 app.router.add_get('/', handle)
+app.router.add_get('/health', handle_health)
+app.router.add_get('/live', handle_live)
 
 async def main():
     runner = web.AppRunner(app)
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+
+class NameCache:
+    """Bounded LRU of user_key -> last known display name.
+
+    Names change rarely, so they are written behind: put() marks a key dirty
+    when its name changed, and take_dirty() hands the pending names to the
+    caller to persist next to the user's stats. Evicting the least recently
+    used key keeps memory flat however many users have ever been seen.
+    """
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._names = OrderedDict()
+        self._dirty = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, key) -> bool:
+        return key in self._names
+
+    def get(self, key):
+        name = self._names.get(key)
+        if name is not None:
+            self._names.move_to_end(key)
+        return name
+
+    def put(self, key, name: str, persist: bool = True) -> bool:
+        """Remember `name` for `key`. Returns True if it differs from the known one."""
+        if not name:
+            return False
+        changed = self._names.get(key) != name
+        self._names[key] = name
+        self._names.move_to_end(key)
+        if changed and persist:
+            self._dirty[key] = name
+        while len(self._names) > self.maxsize:
+            self._names.popitem(last=False)
+        return changed
+
+    def take_dirty(self) -> dict:
+        """Names changed since the last call, as {user_key: name}; the caller persists them."""
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def restore_dirty(self, dirty: dict):
+        """Give back names whose write failed (newer changes win)."""
+        for key, name in dirty.items():
+            self._dirty.setdefault(key, name)
@@ -0,0 +1,55 @@
+import time
+from collections import deque
+
+
+class SlidingWindowCounter:
+    """Per-key count of events in the last `window` seconds.
+
+    Each key holds a deque of monotonic timestamps, oldest first: expired ones are
+    popped from the left as events arrive, so a hit is O(1) amortized. `maxlen`
+    bounds the deque (the count saturates at it), and sweep() drops keys that
+    have been idle for a whole window so memory does not grow with uptime.
+    """
+
+    def __init__(self, window: float, maxlen: int = None, clock=time.monotonic):
+        self.window = window
+        self.maxlen = maxlen
+        self._clock = clock
+        self._events = {}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _expire(self, events: deque, now: float):
+        cutoff = now - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+
+    def hit(self, key, now: float = None) -> int:
+        """Record one event for `key` and return how many fall inside the window."""
+        now = self._clock() if now is None else now
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque(maxlen=self.maxlen)
+        self._expire(events, now)
+        events.append(now)
+        return len(events)
+
+    def count(self, key, now: float = None) -> int:
+        events = self._events.get(key)
+        if not events:
+            return 0
+        self._expire(events, self._clock() if now is None else now)
+        return len(events)
+
+    def reset(self, key):
+        self._events.pop(key, None)
+
+    def sweep(self, now: float = None) -> int:
+        """Evict keys with no event inside the window. Returns how many were dropped."""
+        now = self._clock() if now is None else now
+        cutoff = now - self.window
+        idle = [key for key, events in self._events.items() if not events or events[-1] <= cutoff]
+        for key in idle:
+            del self._events[key]
+        return len(idle)
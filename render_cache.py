@@ -0,0 +1,46 @@
+import time
+
+
+class RenderCache:
+    """Rendered command output (e.g. a leaderboard box) keyed by (scope, board).
+
+    An entry is only served inside the clock-minute bucket it was rendered in,
+    since the text shows the time to the minute, and until invalidate() is
+    called for its scope because the underlying data changed. Each key holds a
+    single entry, so the cache never grows beyond the number of boards.
+    """
+
+    def __init__(self, bucket_seconds: int = 60, clock=time.time):
+        self.bucket_seconds = bucket_seconds
+        self._clock = clock
+        self._entries = {}  # (scope, board) -> (bucket, value)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bucket(self, now: float = None) -> int:
+        return int((self._clock() if now is None else now) // self.bucket_seconds)
+
+    def get(self, scope, board: str, now: float = None):
+        """Cached value for this minute, or None."""
+        entry = self._entries.get((scope, board))
+        if entry is not None and entry[0] == self._bucket(now):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, scope, board: str, value, now: float = None):
+        self._entries[(scope, board)] = (self._bucket(now), value)
+
+    def invalidate(self, scope=None) -> int:
+        """Drop every entry of `scope` (all entries if None). Returns how many were dropped."""
+        keys = [key for key in self._entries if scope is None or key[0] == scope]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,115 @@
+"""Per-user daily stats history and weekly / monthly rollups.
+
+Plain (blocking) pymongo calls with no Discord imports; main.py runs them on the
+Mongo executor right after the daily rollover. Everything is keyed so that
+re-running for the same day overwrites instead of double counting:
+
+  daily_stats   _id "<user_key>:<YYYY-MM-DD>"  one document per active user per day
+  period_stats  _id "<user_key>:<period>"      period "W2026-42" (ISO week) or "M2026-10"
+
+user_key is the users-collection _id (guild scoped, see guild_state); both
+collections also copy the user's guild_id so boards can filter per guild.
+"""
+import datetime
+
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def week_key(day: datetime.date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"W{year}-{week:02d}"
+
+
+def month_key(day: datetime.date) -> str:
+    return f"M{day.strftime('%Y-%m')}"
+
+
+def period_ranges(day: datetime.date):
+    """[(period_key, first_day, last_day)] for the ISO week and month containing `day`."""
+    week_start = day - datetime.timedelta(days=day.weekday())
+    month_start = day.replace(day=1)
+    return [
+        (week_key(day), week_start.strftime(DAY_FORMAT), day.strftime(DAY_FORMAT)),
+        (month_key(day), month_start.strftime(DAY_FORMAT), day.strftime(DAY_FORMAT)),
+    ]
+
+
+def record_day(users, daily, day: str):
+    """Copy the day just rolled into data.yesterday out to daily_stats (server side).
+
+    Only users stamped with this day's rollover and with some minutes are written.
+    """
+    list(users.aggregate([
+        {"$match": {
+            "last_reset_day": day,
+            "$or": [{"data.yesterday.cam_on": {"$gt": 0}}, {"data.yesterday.cam_off": {"$gt": 0}}],
+        }},
+        {"$project": {
+            # legacy documents may carry a numeric _id: $concat only takes strings
+            "_id": {"$concat": [{"$toString": "$_id"}, ":", day]},
+            "user_id": {"$toString": "$_id"},
+            "guild_id": "$guild_id",
+            "day": {"$literal": day},
+            "cam_on": {"$ifNull": ["$data.yesterday.cam_on", 0]},
+            "cam_off": {"$ifNull": ["$data.yesterday.cam_off", 0]},
+        }},
+        {"$merge": {"into": daily.name, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]))
+
+
+def rollup_periods(daily, periods, day: datetime.date):
+    """Recompute the week and month totals of the users active on `day` from daily_stats."""
+    day_str = day.strftime(DAY_FORMAT)
+    user_ids = daily.distinct("user_id", {"day": day_str})
+    if not user_ids:
+        return 0
+    for key, first, last in period_ranges(day):
+        list(daily.aggregate([
+            {"$match": {"user_id": {"$in": user_ids}, "day": {"$gte": first, "$lte": last}}},
+            {"$group": {
+                "_id": "$user_id",
+                "guild_id": {"$first": "$guild_id"},
+                "cam_on": {"$sum": "$cam_on"},
+                "cam_off": {"$sum": "$cam_off"},
+                "days": {"$sum": 1},
+            }},
+            {"$project": {
+                "_id": {"$concat": [{"$toString": "$_id"}, ":", key]},
+                "user_id": "$_id",
+                "guild_id": 1,
+                "period": {"$literal": key},
+                "cam_on": 1,
+                "cam_off": 1,
+                "days": 1,
+            }},
+            {"$merge": {"into": periods.name, "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]))
+    return len(user_ids)
+
+
+def top_period_users(periods, period: str, field: str, limit: int, scope: dict = None):
+    """Top `limit` users of one week / month by `field` ("cam_on" / "cam_off") as [(user_key, minutes)]."""
+    cursor = periods.find(
+        {**(scope or {}), "period": period, field: {"$gt": 0}},
+        projection={"user_id": 1, field: 1},
+        sort=[(field, -1)],
+        limit=limit,
+    )
+    return [(doc["user_id"], doc.get(field, 0)) for doc in cursor]
+
+
+def user_period_totals(periods, user_id: str, keys):
+    """{period_key: (cam_on, cam_off)} for one user, for the requested periods."""
+    cursor = periods.find({"_id": {"$in": [f"{user_id}:{key}" for key in keys]}})
+    return {doc["period"]: (doc.get("cam_on", 0), doc.get("cam_off", 0)) for doc in cursor}
+
+
+def user_recent_days(daily, user_id: str, days: int):
+    """Last `days` recorded days for one user, newest first, as [(day, cam_on, cam_off)]."""
+    cursor = daily.find(
+        {"user_id": user_id},
+        projection={"day": 1, "cam_on": 1, "cam_off": 1},
+        sort=[("day", -1)],
+        limit=days,
+    )
+    return [(doc["day"], doc.get("cam_on", 0), doc.get("cam_off", 0)) for doc in cursor]
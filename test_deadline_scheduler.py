@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Test the cam enforcement deadline scheduler (one heap, one live deadline per key)
+from deadline_scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("TESTING DEADLINE SCHEDULER")
+    print("=" * 50)
+
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(clock=clock)
+
+    # Due deadlines come out in one batch, earliest first; later ones stay pending
+    scheduler.schedule("b", 20, "warn", 2)
+    scheduler.schedule("a", 10, "warn", 1)
+    scheduler.schedule("c", 99, "kick")
+    assert scheduler.next_due() == 10
+    assert scheduler.pop_due(now=5) == []
+    clock.now = 30
+    assert scheduler.pop_due() == [("a", "warn", 1), ("b", "warn", 2)]
+    assert "c" in scheduler and len(scheduler) == 1
+    print("✅ pop_due returns every expired deadline, earliest first")
+
+    # Rescheduling replaces the key's deadline; the stale heap entry never fires
+    scheduler.schedule("c", 10, "kick", "new")  # due at 40 instead of 99
+    assert scheduler.get("c") == (40, "kick", "new")
+    clock.now = 40
+    assert scheduler.pop_due() == [("c", "kick", "new")]
+    clock.now = 100
+    assert scheduler.pop_due() == [] and scheduler.next_due() is None
+    print("✅ schedule replaces a key's deadline (one live deadline per key)")
+
+    # Cancel forgets the key; restored deadlines can be scheduled at an absolute time
+    scheduler.schedule("d", 5, "warn")
+    assert scheduler.cancel("d") and not scheduler.cancel("d")
+    scheduler.schedule_at("e", 90, "kick")  # already overdue
+    assert scheduler.next_due() == 0.0
+    assert scheduler.items() == [("e", 90, "kick", None)]
+    assert scheduler.pop_due() == [("e", "kick", None)]
+    print("✅ cancel drops a deadline, schedule_at fires overdue restores right away")
+
+    # Stale entries are compacted so the heap stays bounded by the live keys
+    for i in range(500):
+        scheduler.schedule("hot", 1000 + i, "warn")
+    assert len(scheduler) == 1 and len(scheduler._heap) <= 130
+    print("✅ heap is compacted when stale entries outnumber live ones")
+
+    print("\n" + "=" * 50)
+    print("✅ TEST PASSED - Deadlines fire once, in order")
+    print("=" * 50)
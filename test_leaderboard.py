@@ -3,7 +3,7 @@
 import datetime
 
 try:
-    from leaderboard import format_time, get_medal_emoji, generate_leaderboard_text, user_rank
+    from leaderboard import format_time, get_medal_emoji, generate_leaderboard_text
 except Exception:
     # Fallback local implementations if import fails
     def format_time(minutes: int) -> str:
@@ -103,32 +103,17 @@ if __name__ == "__main__":
     
     result = generate_leaderboard_text(test_cam_on, test_cam_off)
     print(result)
-    # Also test per-user rank summary
-    try:
-        from main import user_rank
-        print(user_rank("Marcus", test_cam_on, test_cam_off))
-    except Exception:
-        # If running standalone without package path, fallback to local function
-        def user_rank_local(username, cam_on_data, cam_off_data):
-            cam_on_sorted = sorted(cam_on_data, key=lambda x: x[1], reverse=True)
-            cam_off_sorted = sorted(cam_off_data, key=lambda x: x[1], reverse=True)
-            cam_on_users = [u[0] for u in cam_on_sorted]
-            cam_off_users = [u[0] for u in cam_off_sorted]
-            out = []
-            out.append(f"User: {username}")
-            if username in cam_on_users:
-                r = cam_on_users.index(username) + 1
-                out.append(f"CAM ON Rank: #{r} / {len(cam_on_users)}")
-            else:
-                out.append("CAM ON: Not active today")
-            if username in cam_off_users:
-                r = cam_off_users.index(username) + 1
-                out.append(f"CAM OFF Rank: #{r} / {len(cam_off_users)}")
-            else:
-                out.append("CAM OFF: Not active today")
-            return "\n".join(out)
+    # Per-user rank lookups come from the in-memory board index
+    from leaderboard import format_rank_summary
+    from leaderboard_index import BoardIndex
 
-        print(user_rank_local("Marcus", test_cam_on, test_cam_off))
+    board = BoardIndex.from_rows(test_cam_on + [("Tied", 904)])
+    assert board.rank("Roses_r_Rosie 🌹") == (1, 16, 1013, 0)
+    assert board.rank("T O R O") == (2, 16, 904, 109)
+    assert board.rank("Tied") == (2, 16, 904, 109)  # ties share a rank
+    assert board.rank("noname") == (4, 16, 841, 63)  # competition ranking skips #3
+    assert board.rank("Marcus") is None  # not on this board
+    print(format_rank_summary("Marcus", board.rank("Marcus"), BoardIndex.from_rows(test_cam_off).rank("Marcus")))
     print("\n" + "=" * 50)
     print("✅ TEST PASSED - All functions work perfectly!")
     print("=" * 50)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# Test the in-memory leaderboard index (ordering, tie ranking, keyset pages)
+from leaderboard_index import BoardIndex
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("TESTING LEADERBOARD INDEX")
+    print("=" * 50)
+
+    # Ordering: best first, ties by key, users without minutes are not on the board
+    board = BoardIndex.from_rows([("b", 30), ("a", 50), ("c", 30), ("z", 0), ("d", 10)])
+    assert board.top(10) == [("a", 50), ("b", 30), ("c", 30), ("d", 10)]
+    assert "z" not in board and len(board) == 4
+    board.set("d", 60)
+    board.add("b", -30)  # back to 0: leaves the board
+    assert board.top(10) == [("d", 60), ("a", 50), ("c", 30)]
+    board.add("e", 30)
+    assert board.top(2) == [("d", 60), ("a", 50)]
+    print("✅ Ordering: set / add keep the board sorted, 0 minutes removes a user")
+
+    # Rank: competition ranking (1, 2, 3, 3, 5) and the gap to the next higher score
+    board = BoardIndex.from_rows([("a", 90), ("b", 80), ("c", 70), ("d", 70), ("e", 40)])
+    assert board.rank("a") == (1, 5, 90, 0)
+    assert board.rank("c") == (3, 5, 70, 10)
+    assert board.rank("d") == (3, 5, 70, 10)
+    assert board.rank("e") == (5, 5, 40, 30)
+    assert board.rank("missing") is None
+    assert board.neighbors("c") == [("b", 80), ("c", 70), ("d", 70)]
+    print("✅ Rank: ties share a rank, the next rank skips, gaps point at the next score")
+
+    # Page: keyset seek from the last (minutes, key) shown, stable across equal scores
+    first = board.page(2)
+    assert first == [("a", 90), ("b", 80)]
+    second = board.page(2, after=(first[-1][1], first[-1][0]))
+    assert second == [("c", 70), ("d", 70)]
+    third = board.page(2, after=(second[-1][1], second[-1][0]))
+    assert third == [("e", 40)]
+    assert board.page(2, after=(40, "e")) == []
+    assert board.page(10, after=(70, "c")) == [("d", 70), ("e", 40)]  # cursor between tied users
+    print("✅ Page: each page starts right after the previous cursor, ties included")
+
+    print("\n" + "=" * 50)
+    print("✅ TEST PASSED - Board index orders, ranks and pages correctly")
+    print("=" * 50)
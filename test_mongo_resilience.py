@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# Test the MongoDB circuit breaker and backoff helper
+from mongo_resilience import CircuitBreaker, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("TESTING MONGO RESILIENCE")
+    print("=" * 50)
+
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+
+    # Closed: failures below the threshold keep calls flowing; a success resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    assert not breaker.record_success() and breaker.failures == 0
+    print("✅ Closed: failures under the threshold are tolerated, success resets them")
+
+    # Open: the threshold trips it and calls fail fast until the reset timeout
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    clock.now = 29
+    assert not breaker.allow()
+    print("✅ Open: 3 consecutive failures trip the breaker, calls fail fast")
+
+    # Half-open: exactly one probe; its failure re-opens, its success closes
+    clock.now = 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 60
+    assert breaker.allow()
+    assert breaker.record_success() and breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    print("✅ Half-open: one probe at a time, failure re-opens, success closes")
+
+    # Backoff: full jitter, bounded by the capped exponential
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=0.5, cap=8.0)
+        assert 0 <= delay <= min(8.0, 0.5 * 2 ** attempt)
+    print("✅ backoff_delay stays within [0, min(cap, base * 2**attempt)]")
+
+    print("\n" + "=" * 50)
+    print("✅ TEST PASSED - Breaker opens, probes and closes as expected")
+    print("=" * 50)
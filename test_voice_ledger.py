@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# Test the voice session ledger (second-precision minutes, carry and settlement)
+from voice_ledger import VoiceLedger
+
+
+def minutes_by_cam(payout):
+    totals = {True: 0, False: 0}
+    for _, cam, minutes in payout:
+        totals[cam] += minutes
+    return totals
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("TESTING VOICE LEDGER")
+    print("=" * 50)
+
+    # Carry: sub-minute seconds stay in the balance while the member is in voice
+    ledger = VoiceLedger(clock=lambda: 0)
+    ledger.track(1, cam=True, now=0)
+    assert ledger.take_minutes(now=90) == [(1, True, 1)]
+    assert ledger.take_minutes(now=150) == [(1, True, 1)]  # 30s carried + 60s
+    assert ledger.take_minutes(now=170) == []
+    print("✅ Carry: 90s + 60s pays 1 + 1 minutes, the 30s remainder waits")
+
+    # Close: the remainder is rounded to the nearest minute and the member forgotten
+    ledger.close(1, now=170)  # 50s left in the balance
+    assert ledger.take_minutes(now=300) == [(1, True, 1)]
+    assert ledger.take_minutes(now=400) == []
+    ledger.track(2, cam=False, now=0)
+    ledger.close(2, now=29)
+    assert ledger.take_minutes(now=60) == []
+    print("✅ Close: 50s rounds up to 1 minute, 29s rounds away, balances are dropped")
+
+    # Mixed-cam session: the combined remainder is settled once
+    ledger.track(3, cam=True, now=0)
+    ledger.track(3, cam=False, now=31)
+    ledger.close(3, now=62)
+    assert ledger.take_minutes(now=100) == [(3, True, 1)]
+    ledger.track(4, cam=True, now=0)
+    ledger.track(4, cam=False, now=100)  # 100s on, 80s off: 1 + 1 whole, 40s + 20s left
+    ledger.close(4, now=180)
+    assert minutes_by_cam(ledger.take_minutes(now=200)) == {True: 2, False: 1}
+    print("✅ Mixed cam: 31s on + 31s off pays 1 minute; 100s on + 80s off pays 3")
+
+    # Excluded channel: uncounted segments accrue nothing
+    ledger.track(5, cam=True, counted=False, now=0)
+    assert ledger.take_minutes(now=600) == []
+    print("✅ Uncounted channel pays nothing")
+
+    print("\n" + "=" * 50)
+    print("✅ TEST PASSED - Voice ledger settles every second once")
+    print("=" * 50)
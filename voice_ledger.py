@@ -0,0 +1,77 @@
+import time
+
+
+class VoiceLedger:
+    """Per-member voice session ledger with second precision.
+
+    Every member in voice has an open segment: when it started, whether the camera
+    is on, and whether the channel counts (the excluded channel does not). Closing or
+    switching a segment adds its elapsed seconds to that member's cam-on / cam-off
+    balance. take_minutes() pays out whole minutes and carries the leftover seconds
+    while the member stays in voice, so nothing is rounded away however rarely it is
+    called. Once a member has left, the last payout rounds their combined cam-on +
+    cam-off remainder to the nearest minute (credited to the bucket holding most of
+    it) and forgets them, so balances never outlive a session.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._segments = {}  # user_id -> [started_at, cam, counted]
+        self._seconds = {}   # user_id -> [cam_off_seconds, cam_on_seconds]
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._segments
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def members(self):
+        """User ids with an open segment."""
+        return list(self._segments)
+
+    def _accrue(self, user_id, now: float):
+        segment = self._segments.get(user_id)
+        if segment is None:
+            return
+        started_at, cam, counted = segment
+        if counted and now > started_at:
+            balance = self._seconds.setdefault(user_id, [0.0, 0.0])
+            balance[bool(cam)] += now - started_at
+        segment[0] = now
+
+    def track(self, user_id, cam: bool, counted: bool = True, now: float = None):
+        """Open a segment, or close the current one and continue in the given state."""
+        now = self._clock() if now is None else now
+        self._accrue(user_id, now)
+        if user_id in self._segments:
+            self._segments[user_id][1:] = [bool(cam), counted]
+        else:
+            self._segments[user_id] = [now, bool(cam), counted]
+
+    def close(self, user_id, now: float = None):
+        """End a member's session; its seconds stay in the balance until the next take_minutes()."""
+        now = self._clock() if now is None else now
+        self._accrue(user_id, now)
+        self._segments.pop(user_id, None)
+
+    def take_minutes(self, now: float = None):
+        """Accrue every open segment and pay out whole minutes as [(user_id, cam, minutes)]."""
+        now = self._clock() if now is None else now
+        for user_id in list(self._segments):
+            self._accrue(user_id, now)
+        payout = []
+        for user_id, balance in list(self._seconds.items()):
+            paid = [int(balance[False] // 60), int(balance[True] // 60)]
+            if user_id not in self._segments:
+                # Settle the sub-minute carry of both buckets once, not bucket by bucket
+                # (31s on + 31s off is one minute, not two)
+                leftover = [balance[False] - paid[False] * 60, balance[True] - paid[True] * 60]
+                extra = int((sum(leftover) + 30) // 60)
+                for cam in sorted((True, False), key=lambda c: leftover[c], reverse=True)[:extra]:
+                    paid[cam] += 1
+                del self._seconds[user_id]
+            for cam in (True, False):
+                if paid[cam]:
+                    balance[cam] -= paid[cam] * 60
+                    payout.append((user_id, cam, paid[cam]))
+        return payout
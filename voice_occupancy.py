@@ -0,0 +1,89 @@
+import time
+
+
+class VoiceOccupancy:
+    """Who is in which voice channel right now, kept up to date from voice events.
+
+    channel id -> {member id: occupant}, where an occupant is a dict with the
+    member's name, cam / stream flags and when they entered the channel. Channel
+    and cam totals are maintained on every change, so counts are O(1) and a full
+    snapshot never touches Discord caches or the database.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._channels = {}       # channel_id -> {member_id: occupant}
+        self._channel_names = {}  # channel_id -> name
+        self._where = {}          # member_id -> channel_id
+        self.cam_on = 0
+        self.streaming = 0
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, member_id) -> bool:
+        return member_id in self._where
+
+    def members(self):
+        return list(self._where)
+
+    def _count(self, occupant, sign: int):
+        self.cam_on += sign * occupant["cam"]
+        self.streaming += sign * occupant["stream"]
+
+    def update(self, member_id, name: str, channel_id, channel_name: str, cam: bool, stream: bool, now: float = None):
+        """Place a member in a channel (or refresh their flags); moving channels restarts `since`."""
+        now = self._clock() if now is None else now
+        since = now
+        current = self._where.get(member_id)
+        if current is not None:
+            occupant = self._channels[current].get(member_id)
+            if current == channel_id:
+                since = occupant["since"]
+            self.remove(member_id)
+        occupant = {"name": name, "cam": bool(cam), "stream": bool(stream), "since": since}
+        self._channels.setdefault(channel_id, {})[member_id] = occupant
+        self._channel_names[channel_id] = channel_name
+        self._where[member_id] = channel_id
+        self._count(occupant, 1)
+
+    def remove(self, member_id):
+        channel_id = self._where.pop(member_id, None)
+        if channel_id is None:
+            return
+        occupants = self._channels[channel_id]
+        self._count(occupants.pop(member_id), -1)
+        if not occupants:
+            del self._channels[channel_id]
+            self._channel_names.pop(channel_id, None)
+
+    def channel_of(self, member_id):
+        return self._where.get(member_id)
+
+    def snapshot(self, now: float = None):
+        """JSON-ready view: totals plus every occupied channel, busiest first."""
+        now = self._clock() if now is None else now
+        channels = []
+        for channel_id, occupants in self._channels.items():
+            channels.append({
+                "id": str(channel_id),
+                "name": self._channel_names.get(channel_id, ""),
+                "members": [
+                    {
+                        "id": str(member_id),
+                        "name": occ["name"],
+                        "cam": occ["cam"],
+                        "stream": occ["stream"],
+                        "seconds": int(now - occ["since"]),
+                    }
+                    for member_id, occ in sorted(occupants.items(), key=lambda item: item[1]["since"])
+                ],
+            })
+        channels.sort(key=lambda channel: len(channel["members"]), reverse=True)
+        return {
+            "in_voice": len(self._where),
+            "cam_on": self.cam_on,
+            "cam_off": len(self._where) - self.cam_on,
+            "streaming": self.streaming,
+            "channels": channels,
+        }